@@ -2,9 +2,11 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from jinja2 import StrictUndefined
 from itsdangerous import URLSafeSerializer
+from functools import lru_cache
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -12,9 +14,14 @@ login = LoginManager()
 login.login_view = 'auth.login'
 
 
+@lru_cache(maxsize=4)
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key)
+
+
 def get_serializer():
     from flask import current_app
-    return URLSafeSerializer(current_app.config['SECRET_KEY'])
+    return _serializer(current_app.config['SECRET_KEY'])
 
 
 def create_app(config_class=Config):
@@ -28,22 +35,51 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     app.config.from_pyfile('config.py', silent=True)
 
-    db.init_app(app)
+    hops = app.config['PROXY_FIX_HOPS']
+    if hops:
+        # request.remote_addr, which the login limiter keys on, becomes the client address the proxy saw
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    from app.database import init_database
+    from app.http_cache import init_static_cache
+    from app.sessions import init_sessions
+    init_database(app)
+    init_static_cache(app)
+    init_sessions(app)
     migrate.init_app(app, db)
     login.init_app(app)
 
+    from app.reviews import review_log_writer
+    from app.metrics import request_metrics
+    from app.user_cache import user_cache
+    from app.stats import stats_cache
+    from app.jobs import job_worker
+    from app.passwords import password_hasher, login_limiter
+    review_log_writer.init_app(app)
+    request_metrics.init_app(app)
+    user_cache.init_app(app)
+    stats_cache.init_app(app)
+    job_worker.init_app(app)
+    password_hasher.init_app(app)
+    login_limiter.init_app(app)
+
     from app.public.routes import public_bp
     from app.auth.routes import auth_bp
     from app.admin.routes import admin_bp
     from app.flashcards.routes import flashcards_bp
     from app.errors.handlers import errors_bp
+    from app.api.routes import api_bp
 
     app.register_blueprint(public_bp, url_prefix='/public')
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(flashcards_bp, url_prefix='/flashcards')
+    app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(errors_bp)
 
+    from app.cli import register_commands
+    register_commands(app)
+
     @app.shell_context_processor
     def make_shell_context():
         return dict(
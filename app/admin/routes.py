@@ -1,8 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, abort, Response, request, current_app, jsonify
 from app.forms import ChooseForm
 from flask_login import current_user, logout_user, login_required
-from app import db
+from itsdangerous import BadSignature
+from app import db, get_serializer
+from app.metrics import request_metrics
 from app.models import User
+from app.jobs import enqueue_job
+from app.purge import get_deletion_progress
+from app.user_cache import user_cache
+from app.utils import get_user_page, USER_SORTS, NEVER_ACTIVE
+import sqlalchemy as sa
+from datetime import datetime
+
+ROLES = ('Admin', 'Normal')
 
 admin_bp = Blueprint('admin', __name__, template_folder='templates/admin')
 
@@ -19,53 +29,101 @@ def admin():
         try:
             delete_value = int(form.delete.data) if form.delete.data else -1
             change_value = int(form.change.data) if form.change.data else -1
-            admin_count = User.query.filter_by(role='Admin').count()
+            user_id = delete_value if delete_value != -1 else change_value
+            user = db.session.get(User, user_id) if user_id != -1 else None
+            if user_id != -1 and not user:
+                flash(f"User with ID: {user_id} does not exist", 'danger')
+                return redirect(url_for('.admin'))
 
-            if (
-                    delete_value == current_user.id and admin_count > 1
-                    or
-                    change_value == current_user.id and admin_count > 1
-            ):
-                logout_user()
+            if user is not None and user.deleted_at is not None:
+                flash(f"{user.username} is already being deleted", 'danger')
+                return redirect(url_for('.admin'))
 
-            if delete_value != -1:
-                user = User.query.get(delete_value)
-                if not user:
-                    flash(f"User with ID: {delete_value} does not exist", 'danger')
+            # Only count admins when an admin is being removed or demoted
+            if user is not None and user.role == 'Admin':
+                admin_count = db.session.scalar(
+                    sa.select(sa.func.count(User.id)).where(User.role == 'Admin').where(User.deleted_at.is_(None))
+                )
+                if admin_count <= 1:
+                    flash('Must have at least one admin', 'danger')
                     return redirect(url_for('.admin'))
-                if user.role == 'Admin':
-                    if admin_count <= 1:
-                        flash('Must have at least one admin', 'danger')
-                        return redirect(url_for('.admin'))
-                db.session.delete(user)
-                db.session.commit()
-                flash(f"{user.username} has been deleted successfully", 'success')
+                if user.id == current_user.id:
+                    logout_user()
+
+            if delete_value != -1:
+                # The user disappears now, their cards are purged by a background job
+                user.deleted_at = datetime.now()
+                enqueue_job('purge_user', {'user_id': user.id})
+                user_cache.invalidate(user.id)
+                flash(f"{user.username} has been scheduled for deletion", 'success')
                 return redirect(url_for('.admin'))
             elif change_value != -1:
-                user = User.query.get(change_value)
-                if not user:
-                    flash(f"User with ID: {change_value} does not exist", 'danger')
-                    return redirect(url_for('.admin'))
-                if user.role == 'Admin':
-                    if admin_count <= 1:
-                        flash('Must have at least one admin', 'danger')
-                        return redirect(url_for('.admin'))
-                    user.role = 'Normal'
-                else:
-                    user.role = 'Admin'
+                user.role = 'Normal' if user.role == 'Admin' else 'Admin'
                 db.session.commit()
+                user_cache.invalidate(user.id)
                 flash(f"{user.username}'s role has been changed successfully", 'success')
                 return redirect(url_for('.admin'))
         except Exception as e:
             flash('Error occurred while performing action', 'danger')
             print(f"Error: {e}")
 
-    users = User.query.all()
-    headers = ['ID', 'Username', 'Email', 'Role', 'Delete', 'Swap Role']
+    sort = request.args.get('sort', 'id')
+    if sort not in USER_SORTS:
+        sort = 'id'
+    descending = request.args.get('order') == 'desc'
+    role = request.args.get('role') if request.args.get('role') in ROLES else None
+    prefix = request.args.get('q', '').strip()[:64] or None
+    after = decode_user_cursor(request.args.get('after'), sort)
+    users, next_key = get_user_page(
+        current_app.config['ADMIN_USERS_PER_PAGE'],
+        sort=sort,
+        descending=descending,
+        role=role,
+        prefix=prefix,
+        after=after
+    )
+    filters = {'sort': sort, 'order': 'desc' if descending else 'asc', 'role': role or '', 'q': prefix or ''}
+    headers = ['ID', 'Username', 'Email', 'Role', 'Cards', 'Last Active', 'Delete', 'Swap Role']
     return render_template(
         'admin.html',
         title='Admin Page',
         form=form,
         headers=headers,
-        users=users
+        users=users,
+        filters=filters,
+        sorts=USER_SORTS,
+        roles=ROLES,
+        never_active=NEVER_ACTIVE,
+        next_cursor=encode_user_cursor(next_key) if next_key else None
     )
+
+
+def encode_user_cursor(key):
+    value, user_id = key
+    return get_serializer().dumps([value.isoformat() if isinstance(value, datetime) else value, user_id])
+
+
+def decode_user_cursor(cursor, sort):
+    if not cursor:
+        return None
+    try:
+        value, user_id = get_serializer().loads(cursor)
+        return datetime.fromisoformat(value) if sort == 'last_active' else value, int(user_id)
+    except (BadSignature, ValueError, TypeError):
+        return None
+
+
+@admin_bp.route('/deletions', methods=['GET'])
+@login_required
+def deletions():
+    if current_user.role != 'Admin':
+        abort(403)
+    return jsonify(cards_left={str(user_id): cards for user_id, cards in get_deletion_progress().items()})
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+@login_required
+def metrics():
+    if current_user.role != 'Admin':
+        abort(403)
+    return Response(request_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
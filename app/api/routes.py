@@ -0,0 +1,174 @@
+from flask import Blueprint, jsonify, request, current_app
+from flask_login import current_user
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+from app import db
+from app.models import FlashCard
+from app.jobs import get_user_job, job_state
+from app.reviews import grade_card, write_review_batch
+from app.stats import invalidate_user_stats
+from app.study import (get_study_session, start_study_session, current_queued_card, next_queued_card,
+                       queued_card_id, upcoming_queued_cards, take_queued_cards, show_card, show_cards)
+from app.tokens import card_tokens
+from app.utils import get_card
+from datetime import datetime, timedelta
+
+api_bp = Blueprint('api', __name__)
+
+MAX_RESPONSE_MS = 24 * 60 * 60 * 1000
+
+
+@api_bp.before_request
+def check_request():
+    if not current_user.is_authenticated:
+        return jsonify(error='Login required'), 401
+    if request.method == 'POST':
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError as e:
+            return jsonify(error=str(e)), 400
+
+
+def client_response_ms(value):
+    if isinstance(value, int) and 0 <= value <= MAX_RESPONSE_MS:
+        return value
+    return None
+
+
+def client_time(value, now):
+    # Clients send epoch milliseconds, clamped between REVIEW_MAX_AGE_DAYS ago and now
+    if not isinstance(value, (int, float)):
+        return now
+    try:
+        reviewed_at = datetime.fromtimestamp(value / 1000)
+    except (OverflowError, OSError, ValueError):
+        return now
+    oldest = now - timedelta(days=current_app.config['REVIEW_MAX_AGE_DAYS'])
+    return min(max(reviewed_at, oldest), now)
+
+
+def requested_count(name, default):
+    count = request.args.get(name, default, type=int)
+    return min(max(count, 1), current_app.config['STUDY_PREFETCH_MAX'])
+
+
+def study_state(session, card):
+    cards = []
+    if card is not None:
+        first_view = show_card(card)
+        cards = upcoming_queued_cards(session, requested_count('ahead', current_app.config['STUDY_PREFETCH_SIZE']))
+        db.session.commit()
+        if first_view:
+            invalidate_user_stats(current_user.id)
+    else:
+        db.session.commit()
+
+    tokens = card_tokens(queued.id for queued in cards)
+    return jsonify(
+        topic=session.topic,
+        complete=session.position + 1 if cards else 0,
+        total=session.size,
+        cards=[
+            {'token': tokens[queued.id], 'question': queued.question, 'answer': queued.answer}
+            for queued in cards
+        ]
+    )
+
+
+@api_bp.route('/study/<path:topic>', methods=['GET'])
+def study(topic):
+    session = get_study_session(current_user.id, topic)
+    if session is None or request.args.get('restart', type=int) == 1:
+        session = start_study_session(current_user.id, topic)
+    return study_state(session, current_queued_card(session))
+
+
+@api_bp.route('/study/<path:topic>/answer', methods=['POST'])
+def answer(topic):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(error='Expected a JSON object'), 400
+    card_id = FlashCard.decode_hashed_id(data.get('token'))
+    if card_id is None:
+        return jsonify(error='Unknown card'), 400
+
+    correct = data.get('correct')
+    if correct is not None:
+        card = get_card([FlashCard.user_id == current_user.id], card_id)
+        if card is None:
+            return jsonify(error='Unknown card'), 404
+        grade_card(card, bool(correct), response_ms=client_response_ms(data.get('response_ms')))
+
+    session = get_study_session(current_user.id, topic)
+    if session is None:
+        session = start_study_session(current_user.id, topic)
+        card = current_queued_card(session)
+    elif queued_card_id(session) == card_id:
+        session, card = next_queued_card(session)
+    else:
+        # The client is out of step with the queue, send it the current card
+        card = current_queued_card(session)
+    return study_state(session, card)
+
+
+@api_bp.route('/study/<path:topic>/batch', methods=['GET'])
+def study_batch(topic):
+    session = get_study_session(current_user.id, topic)
+    if session is None or request.args.get('restart', type=int) == 1:
+        session = start_study_session(current_user.id, topic)
+    session, cards = take_queued_cards(session, requested_count('size', current_app.config['STUDY_BATCH_SIZE']))
+    first_view = show_cards(cards)
+    db.session.commit()
+    if first_view:
+        invalidate_user_stats(current_user.id)
+
+    tokens = card_tokens(card.id for card in cards)
+    return jsonify(
+        topic=session.topic,
+        position=session.position,
+        total=session.size,
+        cards=[{'token': tokens[card.id], 'question': card.question, 'answer': card.answer} for card in cards]
+    )
+
+
+@api_bp.route('/reviews', methods=['POST'])
+def review_batch():
+    data = request.get_json(silent=True)
+    grades = data.get('grades') if isinstance(data, dict) else None
+    if not isinstance(grades, list):
+        return jsonify(error='Expected a list of grades'), 400
+    if len(grades) > current_app.config['REVIEW_BATCH_MAX']:
+        return jsonify(error=f"Send at most {current_app.config['REVIEW_BATCH_MAX']} grades"), 400
+
+    now = datetime.now()
+    reviews, invalid = [], []
+    for grade in grades:
+        key = grade.get('key') if isinstance(grade, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            continue
+        card_id = FlashCard.decode_hashed_id(grade.get('token'))
+        if card_id is None or not isinstance(grade.get('correct'), bool):
+            invalid.append(key)
+            continue
+        reviews.append({
+            'dedup_key': key,
+            'card_id': card_id,
+            'correct': grade['correct'],
+            'reviewed_at': client_time(grade.get('reviewed_at'), now),
+            'response_ms': client_response_ms(grade.get('response_ms'))
+        })
+
+    applied, duplicates, rejected = write_review_batch(current_user.id, reviews) if reviews else ([], [], [])
+    return jsonify(
+        applied=[review['dedup_key'] for review in applied],
+        duplicates=duplicates,
+        rejected=rejected + invalid
+    )
+
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_user_job(current_user, job_id)
+    if job is None:
+        return jsonify(error='Unknown job'), 404
+    return jsonify(job_state(job))
@@ -3,6 +3,8 @@ from flask_login import current_user, login_user, logout_user, login_required
 from app import db
 from app.forms import LoginForm, ChangePasswordForm, RegisterForm
 from app.models import User
+from app.passwords import password_hasher, login_limiter, PasswordHashingBusy
+from app.user_cache import user_cache
 from app.utils import get_user_by_username
 import sqlalchemy as sa
 from urllib.parse import urlsplit
@@ -10,16 +12,38 @@ from urllib.parse import urlsplit
 auth_bp = Blueprint('auth', __name__, template_folder='templates/auth')
 
 
+def busy_response(template, **context):
+    flash('The server is busy, try again in a moment', 'danger')
+    return render_template(template, **context), 503
+
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('flashcards.dashboard'))
     form = LoginForm()
     if form.validate_on_submit():
+        if not login_limiter.allow(request.remote_addr or '', form.username.data):
+            flash('Too many login attempts, try again later', 'danger')
+            return render_template('login.html', title='Sign In', form=form), 429
+
         user = get_user_by_username(form.username.data)
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.deleted_at is None and user.check_password(form.password.data)
+        except PasswordHashingBusy:
+            return busy_response('login.html', title='Sign In', form=form)
+        if not valid:
             flash('Invalid username or password', 'danger')
             return redirect(url_for('.login'))
+
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.set_password(form.password.data)
+                db.session.commit()
+                user_cache.invalidate(user.id)
+            except PasswordHashingBusy:
+                # The hash is upgraded on a later login instead
+                pass
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or urlsplit(next_page).netloc != '':
@@ -35,7 +59,6 @@ def register():
         user = User()
         user.email = form.email.data
         user.username = form.username.data
-        user.set_password(form.password.data)
         user.role = 'Normal'
 
         existing_user = get_user_by_username(user.username)
@@ -47,6 +70,10 @@ def register():
             flash('Email already used', 'danger')
             return redirect(url_for('.register'))
 
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy:
+            return busy_response('register.html', title='Register', form=form)
         db.session.add(user)
         db.session.commit()
         flash('Account created successfully, login to proceed', 'success')
@@ -69,12 +96,15 @@ def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
         user = get_user_by_username(current_user.username)
-        if not user.check_password(form.password.data):
-            flash('Invalid password', 'danger')
-            return redirect(url_for('.change_password'))
-
-        user.set_password(form.new_password.data)
+        try:
+            if not user.check_password(form.password.data):
+                flash('Invalid password', 'danger')
+                return redirect(url_for('.change_password'))
+            user.set_password(form.new_password.data)
+        except PasswordHashingBusy:
+            return busy_response('change_password.html', title='Change Password', form=form)
         db.session.commit()
+        user_cache.invalidate(user.id)
         flash('Password has been changed successfully', 'success')
         return redirect(url_for('public.landing'))
 
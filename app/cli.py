@@ -0,0 +1,81 @@
+from flask import current_app
+from flask.cli import with_appcontext
+from app.exporter import EXPORT_KINDS, EXPORT_FORMATS, iter_export
+from app.importer import IMPORT_FORMATS, import_file
+from app.jobs import job_worker
+from app.reviews import review_log_writer
+from app.stats import invalidate_user_stats
+from app.utils import get_user_by_username
+import click
+import signal
+
+
+@click.command('import-cards')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='File format, detected from the file extension by default.')
+@click.option('--topic', default=None, help='Topic for rows that do not have one.')
+@with_appcontext
+def import_cards_command(username, path, fmt, topic):
+    """Import flash cards for USERNAME from a CSV, TSV or Anki text export."""
+    user = get_user_by_username(username)
+    if user is None:
+        raise click.ClickException(f"User {username} does not exist")
+    if user.deleted_at is not None:
+        raise click.ClickException(f"User {username} is being deleted")
+
+    report = import_file(
+        user.id,
+        path,
+        fmt,
+        default_topic=topic,
+        chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+        progress=lambda report: click.echo(f"Imported {report.imported} cards...")
+    )
+    invalidate_user_stats(user.id)
+    for line, message in report.errors:
+        click.echo(f"Line {line}: {message}", err=True)
+    click.echo(f"Imported {report.imported} cards, skipped {report.skipped}")
+
+
+@click.command('export-cards')
+@click.argument('username')
+@click.option('--kind', type=click.Choice(EXPORT_KINDS), default='cards', help='Export cards or review history.')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv')
+@click.option('--stats', is_flag=True, help='Include review statistics with each card.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Output file, stdout by default.')
+@with_appcontext
+def export_cards_command(username, kind, fmt, stats, output):
+    """Stream the flash cards or review history of USERNAME as CSV or NDJSON."""
+    user = get_user_by_username(username)
+    if user is None:
+        raise click.ClickException(f"User {username} does not exist")
+
+    if kind == 'reviews':
+        review_log_writer.flush()
+    for chunk in iter_export(user.id, kind, fmt, include_stats=stats):
+        output.write(chunk)
+
+
+@click.command('worker')
+@click.option('--threads', type=int, default=None, help='Jobs to run at once, JOB_WORKER_THREADS by default.')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty instead of waiting for jobs.')
+@with_appcontext
+def worker_command(threads, once):
+    """Run queued background jobs such as imports, progress resets and user purges."""
+    if threads is not None:
+        job_worker.threads = max(threads, 1)
+    signal.signal(signal.SIGTERM, lambda signum, frame: job_worker.stop())
+    click.echo(f"Running jobs with {job_worker.threads} threads")
+    try:
+        job_worker.run(until_idle=once)
+    except KeyboardInterrupt:
+        # Running jobs have finished by the time the interrupt gets here
+        click.echo('Stopped')
+
+
+def register_commands(app):
+    app.cli.add_command(import_cards_command)
+    app.cli.add_command(export_cards_command)
+    app.cli.add_command(worker_command)
@@ -0,0 +1,47 @@
+from app import db
+import sqlalchemy as sa
+
+POOL_OPTIONS = {
+    'DATABASE_POOL_SIZE': 'pool_size',
+    'DATABASE_MAX_OVERFLOW': 'max_overflow',
+    'DATABASE_POOL_TIMEOUT': 'pool_timeout',
+    'DATABASE_POOL_RECYCLE': 'pool_recycle'
+}
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def engine_options(config):
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return options
+
+    options.setdefault('pool_pre_ping', True)
+    for key, option in POOL_OPTIONS.items():
+        if config.get(key) is not None:
+            options.setdefault(option, config[key])
+    return options
+
+
+def sqlite_pragma_listener(pragmas):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def init_database(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if pragmas and is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        with app.app_context():
+            sa.event.listen(db.engine, 'connect', sqlite_pragma_listener(pragmas))
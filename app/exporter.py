@@ -0,0 +1,78 @@
+from app import db
+from app.models import FlashCard, ReviewLog, Topic
+import sqlalchemy as sa
+from datetime import datetime
+import csv
+import io
+import json
+
+EXPORT_KINDS = ('cards', 'reviews')
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH_SIZE = 1000
+
+CARD_COLUMNS = ('topic', 'question', 'answer')
+CARD_STATS_COLUMNS = (
+    'times_seen', 'times_correct', 'times_wrong', 'ease', 'last_seen',
+    'ease_factor', 'interval_days', 'repetitions', 'due_at'
+)
+REVIEW_COLUMNS = ('card_id', 'correct', 'reviewed_at', 'response_ms')
+
+
+def export_query(user_id, kind, include_stats=False):
+    if kind == 'reviews':
+        columns = REVIEW_COLUMNS
+        query = (
+            sa.select(*(getattr(ReviewLog, column) for column in columns))
+            .where(ReviewLog.user_id == user_id)
+            .order_by(ReviewLog.reviewed_at, ReviewLog.id)
+        )
+    else:
+        columns = CARD_COLUMNS + CARD_STATS_COLUMNS if include_stats else CARD_COLUMNS
+        query = (
+            sa.select(*(Topic.name if column == 'topic' else getattr(FlashCard, column) for column in columns))
+            .join(FlashCard.topic)
+            .where(FlashCard.user_id == user_id)
+            .order_by(Topic.name, FlashCard.id)
+        )
+    return columns, query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _plain(value) for column, value in zip(columns, row)}))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines.clear()
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_export(user_id, kind, fmt, include_stats=False):
+    columns, query = export_query(user_id, kind, include_stats)
+    rows = db.session.execute(query)
+    try:
+        if fmt == 'ndjson':
+            yield from iter_ndjson(columns, rows)
+        else:
+            yield from iter_csv(columns, rows)
+    finally:
+        rows.close()
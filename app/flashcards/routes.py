@@ -1,38 +1,49 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask import (Blueprint, render_template, redirect, url_for, flash, abort, request, current_app,
+                   Response, stream_with_context, jsonify)
 from flask_login import current_user, login_required
+from flask_wtf.csrf import generate_csrf
 from app import db
-from app.forms import ChooseForm, AddFlashCardForm
+from app.exporter import EXPORT_KINDS, EXPORT_FORMATS, EXPORT_MIMETYPES, iter_export
+from app.forms import (ChooseForm, AddFlashCardForm, ImportCardsForm, BulkDeleteForm, RenameTopicForm,
+                       ResetTopicForm)
+from app.http_cache import conditional
+from app.importer import detect_format
+from app.jobs import enqueue_job, get_user_job
 from app.models import FlashCard
-from app.utils import reset_and_get_topic_info, grade_card
-import sqlalchemy as sa
-from datetime import datetime
-import random
+from app.stats import get_user_stats, invalidate_user_stats
+from app.reviews import grade_card, review_log_writer
+from app.search import search_cards
+from app.study import (get_study_session, start_study_session, end_study_sessions, first_queued_card,
+                       next_queued_card, previous_queued_card, queued_card, show_card)
+from app.tokens import card_tokens
+from app.utils import (get_topic_counts, get_revision_counts, get_topic_cards, get_card, create_card, update_card,
+                       delete_cards, rename_topic_cards)
+from werkzeug.utils import secure_filename
+from time import time
+from uuid import uuid4
+import os
 
 flashcards_bp = Blueprint('flashcards', __name__, template_folder='templates/flashcards')
 
 
+def response_time_ms():
+    shown = request.args.get('shown', type=int)
+    if shown is None:
+        return None
+    elapsed = int(time() * 1000) - shown
+    return elapsed if 0 <= elapsed <= 24 * 60 * 60 * 1000 else None
+
+
 @flashcards_bp.route('/dashboard', methods=['POST', 'GET'])
 @login_required
+@conditional
 def dashboard():
-    card_date = [card.last_seen.date() if card.last_seen else None for card in current_user.flash_cards]
-    today = datetime.now().date()
-    cards_today = card_date.count(today)
-    cards_total = len(card_date)
-    cards_percent_complete = round((cards_today / cards_total) * 100) if cards_total != 0 else 0
-    cards_info = {
-        'today': today,
-        'cards_total': cards_total,
-        'cards_today': cards_today,
-        'cards_percent_complete': cards_percent_complete
-    }
-    revision = db.session.scalars(
-        sa.select(FlashCard).where(FlashCard.ease <= 75).where(FlashCard.user_id == current_user.id)
-    ).all()
+    cards_info = get_user_stats(current_user.id)
     return render_template(
         'dashboard.html',
         title=f"Home {current_user.username}",
         cards_info=cards_info,
-        revision=revision
+        revision=cards_info['cards_revision']
     )
 
 
@@ -40,149 +51,261 @@ def dashboard():
 @login_required
 def delete_card():
     form = AddFlashCardForm()
-    if form.delete.data != '-1':
-        card = db.session.get(FlashCard, form.delete.data)
-        db.session.delete(card)
+    if form.delete.data != '-1' and form.delete.data.isdigit():
+        delete_cards(current_user.id, [int(form.delete.data)])
         db.session.commit()
+        invalidate_user_stats(current_user.id)
         return redirect(url_for('.flashcards'))
     return redirect(url_for('.flashcards'))
 
 
+@flashcards_bp.route('/bulk_delete', methods=['POST'])
+@login_required
+def bulk_delete():
+    form = BulkDeleteForm()
+    if form.validate_on_submit():
+        card_ids = [int(card_id) for card_id in form.card_ids.data.split(',') if card_id.strip().isdigit()]
+        deleted = delete_cards(current_user.id, card_ids) if card_ids else 0
+        db.session.commit()
+        invalidate_user_stats(current_user.id)
+        flash(f"Deleted {deleted} cards", 'success')
+    return redirect(url_for('.flashcards'))
+
+
+@flashcards_bp.route('/rename_topic', methods=['POST'])
+@login_required
+def rename_topic():
+    form = RenameTopicForm()
+    if form.validate_on_submit():
+        topic = form.topic.data.lower().strip()
+        new_topic = form.new_topic.data.lower().strip()
+        moved = rename_topic_cards(current_user.id, topic, new_topic)
+        end_study_sessions(current_user.id)
+        db.session.commit()
+        invalidate_user_stats(current_user.id)
+        flash(f"Moved {moved} cards from {topic.title()} to {new_topic.title()}", 'success')
+    else:
+        flash('Topic names must be between 1 and 24 characters', 'danger')
+    return redirect(url_for('.flashcards'))
+
+
+@flashcards_bp.route('/reset_topic', methods=['POST'])
+@login_required
+def reset_topic():
+    form = ResetTopicForm()
+    if form.validate_on_submit():
+        topic = form.topic.data.lower().strip()
+        enqueue_job('reset_topic', {'user_id': current_user.id, 'topic': topic}, user_id=current_user.id)
+        flash(f"Resetting progress on {topic.title()} cards", 'success')
+    return redirect(url_for('.flashcards'))
+
+
 @flashcards_bp.route('/add_to_topic', methods=['POST', 'GET'])
 @login_required
 def add_to_topic():
-    topics = reset_and_get_topic_info(current_user)
     form = AddFlashCardForm()
     if form.new.data != '-1' and not form.submit.data:
-        card = db.session.get(FlashCard, form.new.data)
-        card_form = AddFlashCardForm(topic=card.topic.title())
-        return render_template(
-            'flashcards.html',
-            title='Flash Cards',
-            topics=topics,
-            form=card_form,
-            mode='new'
-        )
+        card_form = AddFlashCardForm(topic=form.new.data.title())
+        return render_topics(card_form, mode='new')
 
     if form.submit.data and form.validate_on_submit():
-        new_card = FlashCard(
-            topic=form.topic.data.lower().strip(),
-            question=form.question.data.strip(),
-            answer=form.answer.data.strip()
+        create_card(
+            current_user.id,
+            form.topic.data.lower().strip(),
+            form.question.data.strip(),
+            form.answer.data.strip()
         )
-        current_user.flash_cards.append(new_card)
         db.session.commit()
+        invalidate_user_stats(current_user.id)
         return redirect(url_for('.flashcards'))
     return redirect(url_for('.flashcards'))
 
 
+def get_owned_card(card_id):
+    card_id = str(card_id or '')
+    card = get_card([FlashCard.user_id == current_user.id], int(card_id)) if card_id.isdigit() else None
+    if card is None:
+        abort(404)
+    return card
+
+
 @flashcards_bp.route('/edit_card', methods=['POST', 'GET'])
 @login_required
 def edit_card():
-    topics = reset_and_get_topic_info(current_user)
     form = AddFlashCardForm()
     if form.edit_question.data != '-1' and not form.submit_edit.data:
-        card = db.session.get(FlashCard, form.edit_question.data)
+        card = get_owned_card(form.edit_question.data)
         card_form = AddFlashCardForm(
-            topic=card.topic.title(),
+            topic=card.topic.name.title(),
             question=card.question,
             answer=card.answer
         )
-        return render_template(
-            'flashcards.html',
-            title='Flash Cards',
-            topics=topics,
-            form=card_form,
-            topic_edit=card.topic,
-            mode='edit'
-        )
+        return render_topics(card_form, mode='edit')
 
     if form.submit_edit.data and form.validate_on_submit():
-        card = db.session.get(FlashCard, form.edit_question.data)
-        card.topic = form.topic.data.lower().strip()
-        card.question = form.question.data.strip()
-        card.answer = form.answer.data.strip()
+        card = get_owned_card(form.edit_question.data)
+        update_card(
+            card,
+            form.topic.data.lower().strip(),
+            form.question.data.strip(),
+            form.answer.data.strip()
+        )
         db.session.commit()
+        invalidate_user_stats(current_user.id)
         return redirect(url_for('.flashcards'))
 
 
+@flashcards_bp.route('/import', methods=['POST', 'GET'])
+@login_required
+def import_flashcards():
+    form = ImportCardsForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = detect_format(upload.filename) if form.format.data == 'auto' else form.format.data
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        path = os.path.join(upload_folder, f"{uuid4().hex}_{secure_filename(upload.filename)}")
+        upload.save(path)
+        job = enqueue_job(
+            'import_cards',
+            {'user_id': current_user.id, 'path': path, 'fmt': fmt, 'default_topic': form.topic.data},
+            user_id=current_user.id
+        )
+        return redirect(url_for('.import_flashcards', job=job.id))
+
+    job = get_user_job(current_user, request.args.get('job', type=int) or 0)
+    report = job.result if job is not None and job.status == 'done' else None
+    return render_template(
+        'import.html',
+        title='Import Flash Cards',
+        form=form,
+        job=job,
+        report=report
+    )
+
+
+@flashcards_bp.route('/export/<kind>/<fmt>', methods=['GET'])
+@login_required
+def export_flashcards(kind, fmt):
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    if kind == 'reviews':
+        review_log_writer.flush()
+
+    rows = iter_export(current_user.id, kind, fmt, include_stats=request.args.get('stats', type=int) == 1)
+    return Response(
+        stream_with_context(rows),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f"attachment; filename=mindcraft-{kind}.{fmt}"}
+    )
+
+
+def render_topics(form, mode):
+    topics = get_topic_counts(current_user.id)
+    revision_topics = get_revision_counts(current_user.id)
+    if revision_topics:
+        topics['revision'] = sum(revision_topics.values())
+        topics.update(revision_topics)
+    return render_template(
+        'flashcards.html',
+        title='Flash Cards',
+        topics=topics,
+        form=form,
+        bulk_delete_form=BulkDeleteForm(),
+        rename_form=RenameTopicForm(),
+        reset_form=ResetTopicForm(),
+        per_page=current_app.config['TOPIC_CARDS_PER_PAGE'],
+        mode=mode
+    )
+
+
 @flashcards_bp.route('/topics', methods=['POST', 'GET'])
 @login_required
+@conditional
 def flashcards():
-    topics = reset_and_get_topic_info(current_user)
-    topics['revision'] = {
-        card.id: {
-            'topic': card.topic, 'question': card.question, 'answer': card.answer
-        } for card in current_user.flash_cards if card.ease <= 75
-    }
-    revision_topics = set(info['topic'] for card_id, info in topics['revision'].items())
-    for rev_topic in revision_topics:
-        topics[f"revision - {rev_topic}"] = {
-            card_id: {
-                'topic': info['topic'], 'question': info['question'], 'answer': info['answer']
-            } for card_id, info in topics['revision'].items() if info['topic'] == rev_topic
-        }
-
     form = AddFlashCardForm()
     if form.validate_on_submit():
         topic = form.topic.data.lower().strip()
         question = form.question.data.strip()
         answer = form.answer.data.strip()
-        card = FlashCard(topic=topic, question=question, answer=answer)
-        current_user.flash_cards.append(card)
+        create_card(current_user.id, topic, question, answer)
         db.session.commit()
+        invalidate_user_stats(current_user.id)
         return redirect(url_for('.flashcards'))
 
+    return render_topics(form, mode='normal')
+
+
+@flashcards_bp.route('/topic_cards/<path:topic>', methods=['GET'])
+@login_required
+@conditional
+def topic_cards(topic):
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(
+        max(request.args.get('per_page', current_app.config['TOPIC_CARDS_PER_PAGE'], type=int), 1),
+        current_app.config['TOPIC_CARDS_MAX_PER_PAGE']
+    )
+    cards, has_more = get_topic_cards(current_user.id, topic, page, per_page)
+    return jsonify(topic=topic, page=page, per_page=per_page, has_more=has_more, cards=cards)
+
+
+@flashcards_bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_more = search_cards(
+        current_user.id, query, page, current_app.config['SEARCH_RESULTS_PER_PAGE']
+    ) if query else ([], False)
+    tokens = card_tokens(result['id'] for result in results)
+    for result in results:
+        result['token'] = tokens[result['id']]
     return render_template(
-        'flashcards.html',
-        title='Flash Cards',
-        topics=topics,
-        form=form,
-        mode='normal'
+        'search.html',
+        title='Search Flash Cards',
+        query=query,
+        page=page,
+        has_more=has_more,
+        results=results
+    )
+
+
+@flashcards_bp.route('/study/<path:topic>', methods=['GET'])
+@login_required
+def study(topic):
+    return render_template(
+        'study.html',
+        title=f"{topic.title()} Flash Cards",
+        topic=topic,
+        restart=request.args.get('restart', type=int) == 1,
+        csrf_token=generate_csrf()
     )
 
 
 @flashcards_bp.route('/<path:topic>/<hashed_id>/<show>', methods=['POST', 'GET'])
 @login_required
 def view_topic(topic, hashed_id, show):
-    if topic == 'revision':
-        cards = [card for card in current_user.flash_cards if card.ease <= 75]
-    elif 'revision -' in topic:
-        before, sep, after = topic.partition('-')
-        cards = [card for card in current_user.flash_cards if card.topic == after.strip() and card.ease <= 75]
+    session = get_study_session(current_user.id, topic)
+    if hashed_id == 'start' or session is None:
+        session = start_study_session(current_user.id, topic)
+        card = first_queued_card(session)
+    elif hashed_id == 'next':
+        session, card = next_queued_card(session)
     else:
-        cards = [card for card in current_user.flash_cards if card.topic == topic]
+        card_id = FlashCard.decode_hashed_id(hashed_id)
+        card = queued_card(session, card_id) if card_id else None
+        if card is None:
+            abort(404)
 
-    if not cards:
+    if card is None:
+        db.session.commit()
         flash('No cards exists for this topic.', 'danger')
         return redirect(url_for('.flashcards'))
 
-    card = None
-    if hashed_id != 'next':
-        card_id = FlashCard.decode_hashed_id(hashed_id)
-        if card_id:
-            card = next((card for card in cards if card.id == card_id), None)
-
-    if card is None:
-        unseen_cards = [card for card in cards if not card.seen]
-        if not unseen_cards:
-            for card in cards:
-                card.seen = False
-            db.session.commit()
-            unseen_cards = cards
-        card = random.choice(unseen_cards)
-        if any(card.last_seen for card in cards):
-            seen_cards = sorted(cards, key=lambda card: card.last_seen or datetime.min)
-            last_seen_card = seen_cards[-1] if seen_cards else None
-            if len(cards) > 1:
-                while last_seen_card and card.id == last_seen_card.id:
-                    card = random.choice(unseen_cards)
-
-    if not card.seen:
-        card.last_seen = datetime.now()
-    card.seen = True
+    first_view = show_card(card)
     db.session.commit()
-    complete = len(cards) - len([card for card in cards if not card.seen])
+    if first_view:
+        invalidate_user_stats(current_user.id)
 
     form = ChooseForm()
     return render_template(
@@ -192,8 +315,9 @@ def view_topic(topic, hashed_id, show):
         hashed_id=card.hashed_id,
         show=show,
         card=card,
-        total=len(cards),
-        complete=complete,
+        total=session.size,
+        complete=session.position + 1,
+        shown=request.args.get('shown', type=int) or int(time() * 1000),
         form=form
     )
 
@@ -206,37 +330,24 @@ def flip_card(topic, hashed_id, show):
         '.view_topic',
         topic=topic,
         hashed_id=hashed_id,
-        show=new_show
+        show=new_show,
+        shown=request.args.get('shown', type=int)
     ))
 
 
 @flashcards_bp.route('/previous_card/<path:topic>/<hashed_id>/<show>', methods=['POST', 'GET'])
 @login_required
 def previous_card(topic, hashed_id, show):
-    if topic == 'revision':
-        cards = [card for card in current_user.flash_cards if card.ease <= 75]
-    else:
-        cards = [card for card in current_user.flash_cards if card.topic == topic]
-    seen_cards = sorted([card for card in cards if card.last_seen is not None],
-                        key=lambda card: card.last_seen)
-    current_card_id = FlashCard.decode_hashed_id(hashed_id)
-
-    current_index = None
-    for i, card in enumerate(seen_cards):
-        if card.id == current_card_id:
-            current_index = i
-            break
-    if current_index is None:
-        current_index = len(seen_cards) - 1
-
-    prev_index = (current_index - 1) % len(seen_cards)
-    prev_card = seen_cards[prev_index]
-    prev_card_hashed_id = prev_card.hashed_id
+    session = get_study_session(current_user.id, topic)
+    prev_card = (previous_queued_card(session) or first_queued_card(session)) if session else None
+    db.session.commit()
+    if prev_card is None:
+        return redirect(url_for('.view_topic', topic=topic, hashed_id='start', show='question'))
 
     return redirect(url_for(
         '.view_topic',
         topic=topic,
-        hashed_id=prev_card_hashed_id,
+        hashed_id=prev_card.hashed_id,
         show='question'
     ))
 
@@ -252,14 +363,21 @@ def next_card(topic, hashed_id, show):
     ))
 
 
+def get_session_card(topic, hashed_id):
+    session = get_study_session(current_user.id, topic)
+    card_id = FlashCard.decode_hashed_id(hashed_id)
+    card = queued_card(session, card_id) if session is not None and card_id else None
+    if card is None:
+        abort(404)
+    return card
+
+
 @flashcards_bp.route('/card_correct/<path:topic>/<hashed_id>/<show>', methods=['POST', 'GET'])
 @login_required
 def card_correct(topic, hashed_id, show):
-    card_id = FlashCard.decode_hashed_id(hashed_id)
-    card = db.session.scalar(
-        sa.select(FlashCard).where(FlashCard.id == card_id).where(FlashCard.user_id == current_user.id)
-    ) or abort(404)
-    grade_card(card, True)
+    card = get_session_card(topic, hashed_id)
+    grade_card(card, True, response_ms=response_time_ms())
+    db.session.commit()
     flash('Well done!', 'success')
     return redirect(url_for(
         '.next_card',
@@ -272,11 +390,9 @@ def card_correct(topic, hashed_id, show):
 @flashcards_bp.route('/card_wrong/<path:topic>/<hashed_id>/<show>', methods=['POST', 'GET'])
 @login_required
 def card_wrong(topic, hashed_id, show):
-    card_id = FlashCard.decode_hashed_id(hashed_id)
-    card = db.session.scalar(
-        sa.select(FlashCard).where(FlashCard.id == card_id).where(FlashCard.user_id == current_user.id)
-    ) or abort(404)
-    grade_card(card, False)
+    card = get_session_card(topic, hashed_id)
+    grade_card(card, False, response_ms=response_time_ms())
+    db.session.commit()
     flash('Better luck next time!', 'danger')
     return redirect(url_for(
         '.next_card',
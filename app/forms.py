@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import (SubmitField, HiddenField, StringField, PasswordField,
-                     BooleanField, ValidationError, EmailField)
+                     BooleanField, ValidationError, EmailField, SelectField)
 from wtforms.fields.simple import TextAreaField
-from wtforms.validators import DataRequired, Length, EqualTo
+from wtforms.validators import DataRequired, Length, EqualTo, Optional
 from email_validator import validate_email, EmailNotValidError
 import re
 
@@ -99,3 +100,34 @@ class AddFlashCardForm(FlaskForm):
 
     submit = SubmitField('Add Flash Card')
     submit_edit = SubmitField('Edit Flash Card')
+
+
+class ImportCardsForm(FlaskForm):
+    file = FileField('File', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'tsv', 'txt'], 'Only CSV, TSV or Anki text exports can be imported')
+    ])
+    format = SelectField('Format', choices=[
+        ('auto', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('tsv', 'TSV'),
+        ('anki', 'Anki text export')
+    ], default='auto')
+    topic = StringField('Topic for rows without one', validators=[Optional(), Length(max=24)])
+    submit = SubmitField('Import')
+
+
+class BulkDeleteForm(FlaskForm):
+    card_ids = HiddenField('Cards', validators=[DataRequired()])
+    submit_delete = SubmitField('Delete Selected')
+
+
+class RenameTopicForm(FlaskForm):
+    topic = HiddenField('Topic', validators=[DataRequired()])
+    new_topic = StringField('New Topic', validators=[DataRequired(), Length(max=24)])
+    submit_rename = SubmitField('Rename')
+
+
+class ResetTopicForm(FlaskForm):
+    topic = HiddenField('Topic', validators=[DataRequired()])
+    submit_reset = SubmitField('Reset Progress')
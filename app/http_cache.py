@@ -0,0 +1,92 @@
+from flask import request, session, current_app, make_response
+from flask_login import current_user
+from app.scheduler import next_due_at
+from app.utils import get_cards_version
+from datetime import datetime, time, timedelta
+from functools import lru_cache, wraps
+import hashlib
+import os
+
+
+def _etag_prefix(version):
+    # Pages carry CSRF tokens, so a tag from another session (or before a login rotated it) never matches
+    secret = str(session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'), ''))
+    csrf = hashlib.sha256(secret.encode()).hexdigest()[:8]
+    return f"{current_user.id}-{current_user.role}-{version}-{csrf}-"
+
+
+def etag_expiry(user_id, now):
+    # Due cards and "today" counts change with the clock, so a tag also carries the time it goes stale.
+    # The max age keeps cached pages from outliving their CSRF tokens.
+    expires = min(
+        datetime.combine(now.date() + timedelta(days=1), time.min),
+        now + timedelta(seconds=current_app.config['HTTP_ETAG_MAX_AGE'])
+    )
+    next_due = next_due_at(user_id, now)
+    return min(expires, next_due) if next_due is not None else expires
+
+
+def fresh_etag(version, now):
+    if '_flashes' in session:
+        return None
+    prefix = _etag_prefix(version)
+    for tag in request.if_none_match.as_set(include_weak=True):
+        expires = tag[len(prefix):] if tag.startswith(prefix) else ''
+        if expires.isdigit() and now.timestamp() < int(expires):
+            return tag
+    return None
+
+
+def conditional(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+
+        now = datetime.now()
+        version = get_cards_version(current_user.id)
+        etag = fresh_etag(version, now)
+        if etag is not None:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = f"{_etag_prefix(version)}{int(etag_expiry(current_user.id, now).timestamp())}"
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper
+
+
+@lru_cache(maxsize=256)
+def _fingerprint(path, modified):
+    with open(path, 'rb') as file:
+        return hashlib.md5(file.read()).hexdigest()[:12]
+
+
+def static_fingerprint(app, filename):
+    path = os.path.join(app.static_folder, filename)
+    try:
+        return _fingerprint(path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+
+
+def init_static_cache(app):
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = static_fingerprint(app, values['filename'])
+            if fingerprint is not None:
+                values['v'] = fingerprint
+
+    @app.after_request
+    def static_cache_headers(response):
+        if request.endpoint == 'static' and 'v' in request.args and response.status_code in (200, 304):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
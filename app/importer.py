@@ -0,0 +1,166 @@
+from app import db
+from app.models import FlashCard
+from app.topics import ensure_topics, add_topic_counts
+from app.utils import bump_cards_version
+import sqlalchemy as sa
+from collections import Counter
+from dataclasses import dataclass, field
+import csv
+import os
+
+IMPORT_FORMATS = ('csv', 'tsv', 'anki')
+MAX_TOPIC_LENGTH = 24
+MAX_REPORTED_ERRORS = 100
+
+ANKI_SEPARATORS = {
+    'tab': '\t',
+    'comma': ',',
+    'semicolon': ';',
+    'pipe': '|',
+    'space': ' ',
+    'colon': ':'
+}
+ANKI_METADATA_COLUMNS = ('deck', 'guid', 'notetype', 'tags')
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension == '.tsv':
+        return 'tsv'
+    return 'anki'
+
+
+def _read_anki_header(stream):
+    # Anki text exports start with "#key:value" lines describing the file
+    options = {}
+    position = stream.tell()
+    line = stream.readline()
+    while line.startswith('#'):
+        key, sep, value = line[1:].strip().partition(':')
+        options[key.strip().lower()] = value.strip()
+        position = stream.tell()
+        line = stream.readline()
+    stream.seek(position)
+    return options
+
+
+def _column(header, name):
+    return header.index(name) if name in header else None
+
+
+def iter_rows(stream, fmt, default_topic=None):
+    if fmt == 'anki':
+        options = _read_anki_header(stream)
+        delimiter = ANKI_SEPARATORS.get(options.get('separator', 'tab').lower(), '\t')
+        metadata = {
+            name: int(options[f"{name} column"]) - 1
+            for name in ANKI_METADATA_COLUMNS if options.get(f"{name} column", '').isdigit()
+        }
+        deck_column = metadata.get('deck')
+        reader = csv.reader(stream, delimiter=delimiter)
+        for row in reader:
+            # Deck, guid, notetype and tags columns sit among the note fields, the first two fields left are the card
+            fields = [value for column, value in enumerate(row) if column not in metadata.values()]
+            topic = default_topic
+            if not topic and deck_column is not None and deck_column < len(row):
+                topic = row[deck_column]
+            if len(fields) < 2:
+                yield reader.line_num, None, None, None
+            else:
+                yield reader.line_num, topic, fields[0], fields[1]
+        return
+
+    reader = csv.reader(stream, delimiter='\t' if fmt == 'tsv' else ',')
+    columns = (None, 0, 1)
+    for row in reader:
+        if reader.line_num == 1:
+            header = [name.strip().lower() for name in row]
+            if 'question' in header and 'answer' in header:
+                columns = (_column(header, 'topic'), header.index('question'), header.index('answer'))
+                continue
+            if len(row) >= 3:
+                columns = (0, 1, 2)
+
+        topic_column, question_column, answer_column = columns
+        if len(row) <= max(column for column in columns if column is not None):
+            yield reader.line_num, None, None, None
+            continue
+        topic = row[topic_column] if topic_column is not None else default_topic
+        yield reader.line_num, topic, row[question_column], row[answer_column]
+
+
+def validate_row(topic, question, answer):
+    if question is None:
+        return 'Row does not have enough columns'
+    topic = (topic or '').lower().strip()
+    if not topic:
+        return 'Topic is missing'
+    if len(topic) > MAX_TOPIC_LENGTH:
+        return f"Topic must be at most {MAX_TOPIC_LENGTH} characters"
+    if not question.strip():
+        return 'Question is missing'
+    if not answer.strip():
+        return 'Answer is missing'
+    return None
+
+
+def import_cards(user_id, stream, fmt, default_topic=None, chunk_size=1000, progress=None):
+    report = ImportReport()
+    chunk = []
+
+    def insert_chunk():
+        topic_ids = ensure_topics(user_id, {row['topic'] for row in chunk})
+        for row in chunk:
+            row['topic_id'] = topic_ids[row.pop('topic')]
+        db.session.execute(sa.insert(FlashCard), chunk)
+        for topic_id, count in Counter(row['topic_id'] for row in chunk).items():
+            add_topic_counts(topic_id, cards=count)
+        bump_cards_version(user_id)
+        db.session.commit()
+        report.imported += len(chunk)
+        chunk.clear()
+        if progress is not None:
+            progress(report)
+
+    line = 0
+    try:
+        for line, topic, question, answer in iter_rows(stream, fmt, default_topic):
+            error = validate_row(topic, question, answer)
+            if error:
+                report.add_error(line, error)
+                continue
+            chunk.append({
+                'user_id': user_id,
+                'topic': topic.lower().strip(),
+                'question': question.strip(),
+                'answer': answer.strip(),
+                'seen': False
+            })
+            if len(chunk) >= chunk_size:
+                insert_chunk()
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.add_error(line + 1, f"Import stopped, file could not be read: {e}")
+
+    if chunk:
+        insert_chunk()
+    return report
+
+
+def import_file(user_id, path, fmt=None, default_topic=None, chunk_size=1000, progress=None):
+    fmt = fmt or detect_format(path)
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return import_cards(user_id, stream, fmt, default_topic, chunk_size, progress)
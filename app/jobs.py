@@ -0,0 +1,263 @@
+from flask import current_app
+from app import db
+from app.importer import import_file
+from app.models import Job
+from app.purge import purge_user
+from app.stats import invalidate_user_stats
+from app.utils import reset_topic_stats
+import sqlalchemy as sa
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from threading import Lock, Event, Thread
+from time import monotonic
+from typing import Callable
+import os
+
+JOB_CLAIM_LOCK = 0x6a6f6273
+
+
+@dataclass
+class JobType:
+    handler: Callable
+    concurrency: int = 1
+    max_attempts: int = 3
+
+
+JOB_TYPES = {}
+
+
+def job_type(name, concurrency=1, max_attempts=3):
+    def register(handler):
+        JOB_TYPES[name] = JobType(handler, concurrency, max_attempts)
+        return handler
+
+    return register
+
+
+def enqueue_job(name, payload, user_id=None):
+    job = Job(type=name, payload=payload, user_id=user_id, max_attempts=JOB_TYPES[name].max_attempts)
+    db.session.add(job)
+    db.session.commit()
+    job_worker.notify()
+    return job
+
+
+def get_user_job(user, job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != user.id and user.role != 'Admin'):
+        return None
+    return job
+
+
+def job_state(job):
+    return {
+        'id': job.id,
+        'type': job.type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error,
+        'result': job.result
+    }
+
+
+def has_capacity(job, job_types):
+    # Counting running jobs inside the claim keeps concurrency limits across every worker process
+    running = sa.orm.aliased(Job)
+    running_count = (
+        sa.select(sa.func.count(running.id))
+        .where(running.type == job.type)
+        .where(running.status == 'running')
+        .scalar_subquery()
+    )
+    limit = sa.case({name: job_type.concurrency for name, job_type in job_types.items()}, value=job.type, else_=0)
+    return running_count < limit
+
+
+def claim_job(job_types):
+    now = datetime.now()
+    candidate = sa.orm.aliased(Job)
+    next_job = (
+        sa.select(candidate.id)
+        .where(candidate.status == 'queued')
+        .where(candidate.run_at <= now)
+        .where(candidate.attempts < candidate.max_attempts)
+        .where(has_capacity(candidate, job_types))
+        .order_by(candidate.run_at, candidate.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # SQLite runs one write at a time, PostgreSQL needs claims serialised so two of them never both see room
+        db.session.execute(sa.select(sa.func.pg_advisory_xact_lock(JOB_CLAIM_LOCK)))
+    # Rechecking the status and capacity makes the claim atomic when several workers race for the same row
+    job = db.session.execute(
+        sa.update(Job)
+        .where(Job.id == next_job)
+        .where(Job.status == 'queued')
+        .where(Job.attempts < Job.max_attempts)
+        .where(has_capacity(Job, job_types))
+        .values(status='running', started_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.type, Job.payload, Job.attempts, Job.max_attempts)
+    ).first()
+    db.session.commit()
+    return job
+
+
+def finish_job(job, result=None, error=None, retry_delay=30):
+    now = datetime.now()
+    if error is None:
+        values = {'status': 'done', 'finished_at': now, 'error': None, 'result': result}
+    elif job.attempts < job.max_attempts:
+        values = {'status': 'queued', 'run_at': now + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1)),
+                  'error': error}
+    else:
+        values = {'status': 'failed', 'finished_at': now, 'error': error}
+    db.session.execute(sa.update(Job).where(Job.id == job.id).values(**values))
+    db.session.commit()
+
+
+def requeue_stale_jobs(timeout):
+    # Jobs left running by a worker that died are handed out again, unless they have no attempts left
+    now = datetime.now()
+    stale = sa.and_(Job.status == 'running', Job.started_at < now - timedelta(seconds=timeout))
+    db.session.execute(
+        sa.update(Job)
+        .where(stale)
+        .where(Job.attempts >= Job.max_attempts)
+        .values(status='failed', finished_at=now, error='Timed out')
+    )
+    result = db.session.execute(
+        sa.update(Job)
+        .where(stale)
+        .values(status='queued', run_at=now)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+class JobWorker:
+    def __init__(self, app=None):
+        self.app = None
+        self.threads = 2
+        self.poll_interval = 1.0
+        self.retry_delay = 30
+        self.timeout = 3600
+        self._running = Counter()
+        self._lock = Lock()
+        self._wake = Event()
+        self._stop = Event()
+        self._executor = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threads = app.config['JOB_WORKER_THREADS']
+        self.poll_interval = app.config['JOB_POLL_INTERVAL']
+        self.retry_delay = app.config['JOB_RETRY_DELAY']
+        self.timeout = app.config['JOB_TIMEOUT']
+        app.extensions['job_worker'] = self
+        if app.config['JOBS_IN_PROCESS']:
+            app.before_request(self.start)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self.run, name='job-worker', daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self, until_idle=False):
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='job')
+        recovered_at = None
+        try:
+            while not self._stop.is_set():
+                if recovered_at is None or monotonic() - recovered_at >= self.timeout / 4:
+                    with self.app.app_context():
+                        requeue_stale_jobs(self.timeout)
+                    recovered_at = monotonic()
+                if self.dispatch():
+                    continue
+                if until_idle and not sum(self._running.values()):
+                    return
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def dispatch(self):
+        with self._lock:
+            if sum(self._running.values()) >= self.threads:
+                return False
+            with self.app.app_context():
+                try:
+                    job = claim_job(JOB_TYPES)
+                except sa.exc.OperationalError:
+                    db.session.rollback()
+                    self.app.logger.warning('Could not claim a job, retrying')
+                    return False
+            if job is None:
+                return False
+            self._running[job.type] += 1
+        self._executor.submit(self.execute, job)
+        return True
+
+    def execute(self, job):
+        with self.app.app_context():
+            result, error = None, None
+            try:
+                result = JOB_TYPES[job.type].handler(**job.payload)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Job %s (%s) failed on attempt %s', job.id, job.type, job.attempts)
+                error = f"{type(e).__name__}: {e}"
+            try:
+                finish_job(job, result, error, self.retry_delay)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Could not record the result of job %s', job.id)
+            finally:
+                with self._lock:
+                    self._running[job.type] -= 1
+                self._wake.set()
+
+
+job_worker = JobWorker()
+
+
+@job_type('purge_user', concurrency=1)
+def purge_user_job(user_id):
+    purge_user(user_id, current_app.config['USER_PURGE_CHUNK_SIZE'], current_app.config['USER_PURGE_PAUSE'])
+
+
+# Chunks are committed as they go, so a retry would import the first rows twice
+@job_type('import_cards', concurrency=1, max_attempts=1)
+def import_cards_job(user_id, path, fmt, default_topic=None):
+    try:
+        report = import_file(user_id, path, fmt, default_topic=default_topic,
+                             chunk_size=current_app.config['IMPORT_CHUNK_SIZE'])
+    finally:
+        os.remove(path)
+    if report.imported:
+        invalidate_user_stats(user_id)
+    return asdict(report)
+
+
+@job_type('reset_topic', concurrency=2)
+def reset_topic_job(user_id, topic):
+    reset = reset_topic_stats(user_id, topic)
+    db.session.commit()
+    invalidate_user_stats(user_id)
+    return {'reset': reset}
@@ -0,0 +1,140 @@
+from flask import g, request, has_app_context
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from collections import defaultdict
+from threading import Lock
+from time import perf_counter
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _request_metrics():
+    if has_app_context():
+        return g.get('_request_metrics')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_metrics() is not None:
+        conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _request_metrics()
+    if metrics is not None and conn.info.get('query_start'):
+        metrics['queries'] += 1
+        metrics['sql_seconds'] += perf_counter() - conn.info['query_start'].pop()
+
+
+def _loaded_as_persistent(session, instance):
+    metrics = _request_metrics()
+    if metrics is not None:
+        metrics['rows'] += 1
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.seconds = 0.0
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.query_buckets = [0] * len(QUERY_BUCKETS)
+
+    def observe(self, seconds, queries, sql_seconds, rows):
+        self.requests += 1
+        self.queries += queries
+        self.sql_seconds += sql_seconds
+        self.rows += rows
+        self.seconds += seconds
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.duration_buckets[i] += 1
+        for i, bound in enumerate(QUERY_BUCKETS):
+            if queries <= bound:
+                self.query_buckets[i] += 1
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self.server_timing = False
+        self._endpoints = defaultdict(EndpointMetrics)
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.server_timing = app.config['METRICS_SERVER_TIMING']
+        app.extensions['request_metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        for target, name, listener in (
+                (sa.engine.Engine, 'before_cursor_execute', _before_cursor_execute),
+                (sa.engine.Engine, 'after_cursor_execute', _after_cursor_execute),
+                (so.Session, 'loaded_as_persistent', _loaded_as_persistent)
+        ):
+            if not sa.event.contains(target, name, listener):
+                sa.event.listen(target, name, listener)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self):
+        g._request_metrics = {'start': perf_counter(), 'queries': 0, 'sql_seconds': 0.0, 'rows': 0}
+
+    def _finish_request(self, response):
+        metrics = g.pop('_request_metrics', None)
+        if metrics is None:
+            return response
+
+        seconds = perf_counter() - metrics['start']
+        with self._lock:
+            self._endpoints[request.endpoint or 'unknown'].observe(
+                seconds, metrics['queries'], metrics['sql_seconds'], metrics['rows']
+            )
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f"sql;dur={metrics['sql_seconds'] * 1000:.2f};desc=\"{metrics['queries']} queries, "
+                f"{metrics['rows']} rows\", app;dur={seconds * 1000:.2f}"
+            )
+        return response
+
+    def render_prometheus(self):
+        with self._lock:
+            endpoints = sorted(
+                (endpoint, vars(metrics).copy()) for endpoint, metrics in self._endpoints.items()
+            )
+
+        lines = []
+        for name, kind, help_text, key in (
+                ('mindcraft_requests_total', 'counter', 'Requests handled.', 'requests'),
+                ('mindcraft_sql_queries_total', 'counter', 'SQL statements executed.', 'queries'),
+                ('mindcraft_sql_seconds_total', 'counter', 'Time spent executing SQL.', 'sql_seconds'),
+                ('mindcraft_rows_hydrated_total', 'counter', 'ORM instances loaded.', 'rows')
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for endpoint, metrics in endpoints:
+                lines.append(f"{name}{{endpoint=\"{endpoint}\"}} {metrics[key]}")
+
+        for name, help_text, buckets, counts_key, sum_key in (
+                ('mindcraft_request_duration_seconds', 'Request handler time.',
+                 DURATION_BUCKETS, 'duration_buckets', 'seconds'),
+                ('mindcraft_request_queries', 'SQL statements per request.',
+                 QUERY_BUCKETS, 'query_buckets', 'queries')
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, metrics in endpoints:
+                for bound, count in zip(buckets, metrics[counts_key]):
+                    lines.append(f"{name}_bucket{{endpoint=\"{endpoint}\",le=\"{bound}\"}} {count}")
+                lines.append(f"{name}_bucket{{endpoint=\"{endpoint}\",le=\"+Inf\"}} {metrics['requests']}")
+                lines.append(f"{name}_sum{{endpoint=\"{endpoint}\"}} {metrics[sum_key]}")
+                lines.append(f"{name}_count{{endpoint=\"{endpoint}\"}} {metrics['requests']}")
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
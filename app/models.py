@@ -5,8 +5,10 @@ from flask_login import UserMixin
 from sqlalchemy import ForeignKey
 from sqlalchemy.testing.schema import mapped_column
 from sqlalchemy.orm import relationship
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db, login, get_serializer
+from app import db, login
+from app.passwords import password_hasher
+from app.tokens import card_token, decode_card_token
+from app.user_cache import user_cache
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -18,29 +20,66 @@ class User(UserMixin, db.Model):
     username: so.Mapped[str] = so.mapped_column(sa.String(64), index=True, unique=True)
     email: so.Mapped[str] = so.mapped_column(sa.String(120), index=True, unique=True)
     password_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256))
-    role: so.Mapped[str] = so.mapped_column(sa.String(24), nullable=False, default='Normal')
-    flash_cards: so.Mapped[list['FlashCard']] = relationship(back_populates='user', cascade='all, delete-orphan')
+    role: so.Mapped[str] = so.mapped_column(sa.String(24), index=True, nullable=False, default='Normal')
+    cards_version: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    deleted_at: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime, default=None)
+    flash_cards: so.WriteOnlyMapped['FlashCard'] = relationship(
+        back_populates='user', cascade='all, delete-orphan', passive_deletes=True
+    )
 
     def __repr__(self):
         return f"User(id={self.id}, username={self.username}, email={self.email}, role={self.role})"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+
+USER_CACHE_COLUMNS = ('id', 'username', 'email', 'password_hash', 'role')
 
 
 @login.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
+    user_id = int(id)
+    values = user_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is None or user.deleted_at is not None:
+            return None
+        user_cache.set(user_id, {column: getattr(user, column) for column in USER_CACHE_COLUMNS})
+        return user
+
+    # Attach the cached row to the session without selecting it again
+    user = User(**values)
+    so.make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@dataclass
+class Topic(db.Model):
+    __tablename__ = 'topics'
+    __table_args__ = (sa.UniqueConstraint('user_id', 'name'),)
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    user_id: so.Mapped[int] = so.mapped_column(ForeignKey('users.id', ondelete='CASCADE', name='fk_topics_user_id_users'), index=True)
+    name: so.Mapped[str] = so.mapped_column(sa.String(24), nullable=False)
+    # Counters kept up to date on every card write. There is no due count: cards fall due as time passes
+    # with nothing written, so stats count them from the (user_id, due_at) index instead.
+    card_count: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    mastered_count: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    cards: so.WriteOnlyMapped['FlashCard'] = relationship(back_populates='topic', passive_deletes=True)
 
 
 @dataclass
 class FlashCard(db.Model):
     __tablename__ = 'flash_cards'
+    __table_args__ = (
+        sa.Index('ix_flash_cards_topic_seen', 'topic_id', 'seen'),
+        sa.Index('ix_flash_cards_user_due_at', 'user_id', 'due_at'),
+        sa.Index('ix_flash_cards_user_last_seen', 'user_id', 'last_seen'),
+    )
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
-    topic: so.Mapped[str] = so.mapped_column(sa.String(24), index=True, nullable=False)
     question: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
     answer: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
     seen: so.Mapped[bool] = so.mapped_column(sa.Boolean, nullable=False, default=False)
@@ -49,20 +88,88 @@ class FlashCard(db.Model):
     times_correct: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
     times_wrong: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
     ease: so.Mapped[int] = so.mapped_column(sa.Integer, default=100)
+    ease_factor: so.Mapped[float] = so.mapped_column(sa.Float, nullable=False, default=2.5)
+    interval_days: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    repetitions: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    due_at: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime, default=None)
+
+    topic_id: so.Mapped[int] = so.mapped_column(ForeignKey('topics.id', ondelete='CASCADE', name='fk_flash_cards_topic_id_topics'), nullable=False)
+    topic: so.Mapped['Topic'] = relationship(back_populates='cards')
 
-    user_id: so.Mapped[int] = so.mapped_column(ForeignKey('users.id'), index=True)
+    user_id: so.Mapped[int] = so.mapped_column(ForeignKey('users.id', ondelete='CASCADE', name='fk_flash_cards_user_id_users'), index=True)
     user: so.Mapped['User'] = relationship(back_populates='flash_cards')
 
     @property
     def hashed_id(self):
-        s = get_serializer()
-        return s.dumps(self.id)
+        return card_token(self.id)
 
     @classmethod
     def decode_hashed_id(cls, token):
-        s = get_serializer()
-        try:
-            original_id = s.loads(token)
-            return original_id
-        except Exception:
-            return None
+        return decode_card_token(token)
+
+
+@dataclass
+class StudySession(db.Model):
+    __tablename__ = 'study_sessions'
+    __table_args__ = (sa.UniqueConstraint('user_id', 'topic'),)
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    user_id: so.Mapped[int] = so.mapped_column(ForeignKey('users.id', ondelete='CASCADE', name='fk_study_sessions_user_id_users'), index=True)
+    topic: so.Mapped[str] = so.mapped_column(sa.String(64), nullable=False)
+    position: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    size: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    created_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False, default=datetime.now)
+
+
+@dataclass
+class StudyQueueItem(db.Model):
+    __tablename__ = 'study_queue_items'
+    session_id: so.Mapped[int] = so.mapped_column(
+        ForeignKey('study_sessions.id', ondelete='CASCADE'), primary_key=True
+    )
+    position: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)
+    card_id: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False)
+
+
+@dataclass
+class ReviewLog(db.Model):
+    __tablename__ = 'review_logs'
+    __table_args__ = (
+        sa.Index('ix_review_logs_user_reviewed_at', 'user_id', 'reviewed_at'),
+        sa.Index('ix_review_logs_user_dedup_key', 'user_id', 'dedup_key', unique=True),
+    )
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    user_id: so.Mapped[int] = so.mapped_column(ForeignKey('users.id', ondelete='CASCADE', name='fk_review_logs_user_id_users'))
+    card_id: so.Mapped[int] = so.mapped_column(sa.Integer, index=True, nullable=False)
+    correct: so.Mapped[bool] = so.mapped_column(sa.Boolean, nullable=False)
+    reviewed_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False)
+    response_ms: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer, default=None)
+    dedup_key: so.Mapped[Optional[str]] = so.mapped_column(sa.String(64), default=None)
+
+
+@dataclass
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (sa.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    type: so.Mapped[str] = so.mapped_column(sa.String(32), nullable=False)
+    status: so.Mapped[str] = so.mapped_column(sa.String(16), nullable=False, default='queued')
+    payload: so.Mapped[dict] = so.mapped_column(sa.JSON, nullable=False, default=dict)
+    user_id: so.Mapped[Optional[int]] = so.mapped_column(
+        ForeignKey('users.id', ondelete='SET NULL', name='fk_jobs_user_id_users'), index=True, default=None
+    )
+    attempts: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+    max_attempts: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=3)
+    run_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False, default=datetime.now)
+    created_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False, default=datetime.now)
+    started_at: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime, default=None)
+    finished_at: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime, default=None)
+    error: so.Mapped[Optional[str]] = so.mapped_column(sa.Text, default=None)
+    result: so.Mapped[Optional[dict]] = so.mapped_column(sa.JSON, default=None)
+
+
+@dataclass
+class SessionRecord(db.Model):
+    __tablename__ = 'sessions'
+    id: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    data: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
+    expires_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, index=True, nullable=False)
@@ -0,0 +1,99 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.ttl_cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import Lock, BoundedSemaphore
+from time import monotonic
+
+
+class PasswordHashingBusy(Exception):
+    pass
+
+
+@lru_cache(maxsize=8)
+def hash_prefix(method):
+    # werkzeug fills in default parameters, e.g. "scrypt" is stored as "scrypt:32768:8:1"
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.timeout = 10
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        threads = app.config['PASSWORD_HASH_THREADS']
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='password-hash')
+        self._slots = BoundedSemaphore(threads + app.config['PASSWORD_HASH_QUEUE'])
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        # Hashing is CPU bound, past the queue limit requests are turned away instead of piling up
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHashingBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != hash_prefix(self.method)
+
+
+class TokenBuckets:
+    def __init__(self, capacity, refill_seconds, maxsize=10000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        # A bucket left alone long enough to refill completely is no different from a new one
+        self._buckets = TTLCache(maxsize, capacity * refill_seconds)
+        self._lock = Lock()
+
+    def take(self, key):
+        now = monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key) or (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets.set(key, (tokens, now))
+            return allowed
+
+
+class LoginLimiter:
+    def __init__(self, app=None):
+        self.by_ip = TokenBuckets(20, 3)
+        self.by_username = TokenBuckets(5, 30)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        size = app.config['LOGIN_LIMITER_SIZE']
+        self.by_ip = TokenBuckets(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_REFILL_SECONDS'], size)
+        self.by_username = TokenBuckets(
+            app.config['LOGIN_USERNAME_BURST'], app.config['LOGIN_USERNAME_REFILL_SECONDS'], size
+        )
+        app.extensions['login_limiter'] = self
+
+    def allow(self, ip, username):
+        return self.by_ip.take(ip) and self.by_username.take(username.strip().lower())
+
+
+password_hasher = PasswordHasher()
+login_limiter = LoginLimiter()
@@ -0,0 +1,46 @@
+from app import db
+from app.models import User, Topic, FlashCard, ReviewLog
+from app.reviews import review_log_writer
+from app.stats import invalidate_user_stats
+from app.study import end_study_sessions
+from app.user_cache import user_cache
+import sqlalchemy as sa
+from time import sleep
+
+
+def get_deletion_progress():
+    return dict(db.session.execute(
+        sa.select(User.id, sa.func.count(FlashCard.id))
+        .outerjoin(FlashCard, FlashCard.user_id == User.id)
+        .where(User.deleted_at.is_not(None))
+        .group_by(User.id)
+    ).all())
+
+
+def delete_in_chunks(model, user_id, chunk_size, pause):
+    while True:
+        chunk = sa.select(model.id).where(model.user_id == user_id).limit(chunk_size)
+        deleted = db.session.execute(sa.delete(model).where(model.id.in_(chunk))).rowcount
+        # Commit each chunk so other writers get the database between them
+        db.session.commit()
+        if deleted < chunk_size:
+            return
+        sleep(pause)
+
+
+def purge_user(user_id, chunk_size, pause=0):
+    user = db.session.get(User, user_id)
+    if user is None or user.deleted_at is None:
+        return
+
+    # Reviews recorded before the user was marked deleted must not land after the purge
+    review_log_writer.flush()
+    delete_in_chunks(FlashCard, user_id, chunk_size, pause)
+    delete_in_chunks(ReviewLog, user_id, chunk_size, pause)
+    end_study_sessions(user_id)
+    db.session.execute(sa.delete(Topic).where(Topic.user_id == user_id))
+    # Anything written since the last chunk goes with the user through ON DELETE CASCADE
+    db.session.execute(sa.delete(User).where(User.id == user_id))
+    db.session.commit()
+    user_cache.invalidate(user_id)
+    invalidate_user_stats(user_id)
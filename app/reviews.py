@@ -0,0 +1,156 @@
+from app import db
+from app.models import FlashCard, ReviewLog
+from app.scheduler import schedule_review, is_mastered
+from app.stats import invalidate_user_stats
+from app.topics import add_topic_counts
+from app.utils import calculate_ease, bump_cards_version
+import sqlalchemy as sa
+from collections import Counter
+from datetime import datetime
+from threading import Lock, Event, Thread
+import atexit
+
+
+def apply_review(card, correct, reviewed_at=None):
+    card.times_seen += 1
+    if correct:
+        card.times_correct += 1
+    else:
+        card.times_wrong += 1
+
+    card.ease = calculate_ease(card)
+    schedule_review(card, correct, reviewed_at)
+    return card
+
+
+def write_reviews(reviews):
+    db.session.execute(sa.insert(ReviewLog), reviews)
+    card_ids = {review['card_id'] for review in reviews}
+    cards = {
+        card.id: card
+        for card in db.session.scalars(sa.select(FlashCard).where(FlashCard.id.in_(card_ids)))
+    }
+    mastered = Counter()
+    for review in sorted(reviews, key=lambda review: review['reviewed_at']):
+        card = cards.get(review['card_id'])
+        if card is not None:
+            was_mastered = is_mastered(card)
+            apply_review(card, review['correct'], review['reviewed_at'])
+            mastered[card.topic_id] += is_mastered(card) - was_mastered
+    for topic_id, change in mastered.items():
+        if change:
+            add_topic_counts(topic_id, mastered=change)
+    for user_id in {review['user_id'] for review in reviews}:
+        bump_cards_version(user_id)
+    db.session.commit()
+    for user_id in {review['user_id'] for review in reviews}:
+        invalidate_user_stats(user_id)
+
+
+class ReviewLogWriter:
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 100
+        self.flush_interval = 0.25
+        self._pending = []
+        self._lock = Lock()
+        self._wake = Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config['REVIEW_LOG_BATCH_SIZE']
+        self.flush_interval = app.config['REVIEW_LOG_FLUSH_INTERVAL']
+        app.extensions['review_log_writer'] = self
+        atexit.register(self.flush)
+
+    def record(self, user_id, card_id, correct, response_ms=None, reviewed_at=None):
+        review = {
+            'user_id': user_id,
+            'card_id': card_id,
+            'correct': correct,
+            'reviewed_at': reviewed_at or datetime.now(),
+            'response_ms': response_ms
+        }
+        if self.flush_interval <= 0:
+            self._write([review])
+            return
+
+        with self._lock:
+            self._pending.append(review)
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='review-log-writer', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            reviews, self._pending = self._pending, []
+        if not reviews or self.app is None:
+            return
+
+        with self.app.app_context():
+            try:
+                self._write(reviews)
+            except sa.exc.OperationalError:
+                db.session.rollback()
+                self.app.logger.warning('Review log flush failed, retrying %s reviews', len(reviews))
+                with self._lock:
+                    self._pending[:0] = reviews
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Dropped %s reviews after a failed flush', len(reviews))
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _write(self, reviews):
+        write_reviews(reviews)
+
+
+review_log_writer = ReviewLogWriter()
+
+
+def grade_card(card, correct, response_ms=None):
+    review_log_writer.record(card.user_id, card.id, correct, response_ms)
+    return card
+
+
+def write_review_batch(user_id, reviews):
+    # Reviews carry a client generated dedup_key so a retried batch is only applied once
+    for attempt in range(2):
+        card_ids = {review['card_id'] for review in reviews}
+        owned = set(db.session.scalars(
+            sa.select(FlashCard.id).where(FlashCard.user_id == user_id).where(FlashCard.id.in_(card_ids))
+        ))
+        seen = set(db.session.scalars(
+            sa.select(ReviewLog.dedup_key)
+            .where(ReviewLog.user_id == user_id)
+            .where(ReviewLog.dedup_key.in_([review['dedup_key'] for review in reviews]))
+        ))
+        applied, duplicates, rejected = [], [], []
+        for review in reviews:
+            if review['card_id'] not in owned:
+                rejected.append(review['dedup_key'])
+            elif review['dedup_key'] in seen:
+                duplicates.append(review['dedup_key'])
+            else:
+                seen.add(review['dedup_key'])
+                applied.append({'user_id': user_id, **review})
+        if not applied:
+            return applied, duplicates, rejected
+        try:
+            write_reviews(applied)
+            return applied, duplicates, rejected
+        except sa.exc.IntegrityError:
+            # A concurrent retry of the same batch won the race, recheck which keys are new
+            db.session.rollback()
+            if attempt:
+                raise
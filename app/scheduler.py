@@ -0,0 +1,53 @@
+from app import db
+from app.models import FlashCard
+import sqlalchemy as sa
+from datetime import datetime, timedelta
+
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+MIN_EASE_FACTOR = 1.3
+REVISION_QUEUE_SIZE = 200
+MASTERED_INTERVAL_DAYS = 21
+
+
+def due_filter(now=None):
+    return FlashCard.due_at <= (now or datetime.now())
+
+
+def mastered_filter():
+    return FlashCard.interval_days >= MASTERED_INTERVAL_DAYS
+
+
+def is_mastered(card):
+    return card.interval_days >= MASTERED_INTERVAL_DAYS
+
+
+def schedule_review(card, correct, reviewed_at=None):
+    reviewed_at = reviewed_at or datetime.now()
+    quality = QUALITY_CORRECT if correct else QUALITY_WRONG
+    if quality >= 3:
+        if card.repetitions == 0:
+            card.interval_days = 1
+        elif card.repetitions == 1:
+            card.interval_days = 6
+        else:
+            card.interval_days = round(card.interval_days * card.ease_factor)
+        card.repetitions += 1
+    else:
+        card.repetitions = 0
+        card.interval_days = 0
+
+    card.ease_factor = max(
+        MIN_EASE_FACTOR,
+        card.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    )
+    card.due_at = reviewed_at + timedelta(days=card.interval_days)
+    return card
+
+
+def next_due_at(user_id, now=None):
+    return db.session.scalar(
+        sa.select(sa.func.min(FlashCard.due_at))
+        .where(FlashCard.user_id == user_id)
+        .where(FlashCard.due_at > (now or datetime.now()))
+    )
@@ -0,0 +1,102 @@
+from app import db
+from app.models import FlashCard
+from markupsafe import escape, Markup
+import sqlalchemy as sa
+import re
+
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 12
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS flash_cards_fts USING fts5("
+    "question, answer, content='flash_cards', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_insert AFTER INSERT ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_delete AFTER DELETE ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_update AFTER UPDATE OF question, answer ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END"
+)
+
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE flash_cards ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', question || ' ' || answer)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_flash_cards_search_vector ON flash_cards USING gin (search_vector)"
+)
+
+for statement in SQLITE_SEARCH_DDL:
+    sa.event.listen(FlashCard.__table__, 'after_create', sa.DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_SEARCH_DDL:
+    sa.event.listen(FlashCard.__table__, 'after_create', sa.DDL(statement).execute_if(dialect='postgresql'))
+
+SQLITE_SEARCH = sa.text(f"""
+    SELECT flash_cards.id, topics.name AS topic,
+           snippet(flash_cards_fts, 0, :start, :end, '…', {SNIPPET_TOKENS}) AS question,
+           snippet(flash_cards_fts, 1, :start, :end, '…', {SNIPPET_TOKENS}) AS answer
+    FROM flash_cards_fts
+    JOIN flash_cards ON flash_cards.id = flash_cards_fts.rowid
+    JOIN topics ON topics.id = flash_cards.topic_id
+    WHERE flash_cards_fts MATCH :query AND flash_cards.user_id = :user_id
+    ORDER BY bm25(flash_cards_fts)
+    LIMIT :limit OFFSET :offset
+""")
+
+POSTGRES_SEARCH = sa.text("""
+    SELECT matches.id, matches.topic,
+           ts_headline('simple', matches.question, matches.tsquery, :options) AS question,
+           ts_headline('simple', matches.answer, matches.tsquery, :options) AS answer
+    FROM (
+        SELECT flash_cards.id, topics.name AS topic, flash_cards.question, flash_cards.answer,
+               ts_rank(flash_cards.search_vector, tsquery) AS rank, tsquery
+        FROM flash_cards
+        JOIN topics ON topics.id = flash_cards.topic_id
+        CROSS JOIN to_tsquery('simple', :query) AS tsquery
+        WHERE flash_cards.search_vector @@ tsquery AND flash_cards.user_id = :user_id
+        ORDER BY rank DESC, flash_cards.id
+        LIMIT :limit OFFSET :offset
+    ) AS matches
+    ORDER BY matches.rank DESC, matches.id
+""")
+
+
+def search_terms(text):
+    return re.findall(r'\w+', text.lower())[:10]
+
+
+def highlight(snippet):
+    return Markup(
+        str(escape(snippet)).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+    )
+
+
+def search_cards(user_id, text, page, per_page):
+    terms = search_terms(text)
+    if not terms:
+        return [], False
+
+    params = {'user_id': user_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    if db.engine.dialect.name == 'postgresql':
+        statement = POSTGRES_SEARCH
+        params['query'] = ' & '.join(f"{term}:*" for term in terms)
+        params['options'] = (
+            f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords=5"
+        )
+    else:
+        statement = SQLITE_SEARCH
+        params['query'] = ' '.join(f'"{term}"*' for term in terms)
+        params['start'] = SNIPPET_START
+        params['end'] = SNIPPET_END
+
+    rows = db.session.execute(statement, params).all()
+    results = [
+        {'id': card_id, 'topic': topic, 'question': highlight(question), 'answer': highlight(answer)}
+        for card_id, topic, question, answer in rows[:per_page]
+    ]
+    return results, len(rows) > per_page
@@ -0,0 +1,237 @@
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+from werkzeug.datastructures import CallbackDict
+from app import db
+from app.models import SessionRecord
+from app.ttl_cache import TTLCache
+import sqlalchemy as sa
+from datetime import datetime, timedelta
+from threading import Lock, Thread, get_ident
+from time import sleep
+import os
+import re
+import secrets
+
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{32}$')
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or new_session_id()
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        # A fresh id after login keeps a session id planted before it from being reused
+        self.rotate = True
+        self.modified = True
+
+
+class DatabaseSessionStore:
+    def load(self, sid, now):
+        with db.engine.connect() as connection:
+            return connection.execute(
+                sa.select(SessionRecord.data, SessionRecord.expires_at)
+                .where(SessionRecord.id == sid)
+                .where(SessionRecord.expires_at > now)
+            ).first()
+
+    def save(self, sid, data, expires_at):
+        # Its own transaction, so saving a session never commits work a view left in db.session
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                sa.update(SessionRecord).where(SessionRecord.id == sid).values(data=data, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                connection.execute(sa.insert(SessionRecord).values(id=sid, data=data, expires_at=expires_at))
+
+    def delete(self, sid):
+        with db.engine.begin() as connection:
+            connection.execute(sa.delete(SessionRecord).where(SessionRecord.id == sid))
+
+    def sweep(self, now):
+        with db.engine.begin() as connection:
+            return connection.execute(sa.delete(SessionRecord).where(SessionRecord.expires_at <= now)).rowcount
+
+
+class FilesystemSessionStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _read(self, path):
+        # The first line holds the expiry timestamp, the rest is the session data
+        with open(path, encoding='utf-8') as file:
+            expires, data = file.read().split('\n', 1)
+        return data, datetime.fromtimestamp(float(expires))
+
+    def load(self, sid, now):
+        try:
+            data, expires_at = self._read(os.path.join(self.directory, sid))
+        except (OSError, ValueError):
+            return None
+        return (data, expires_at) if expires_at > now else None
+
+    def save(self, sid, data, expires_at):
+        path = os.path.join(self.directory, sid)
+        temporary = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(f"{expires_at.timestamp()}\n{data}")
+        os.replace(temporary, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(os.path.join(self.directory, sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now):
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not SESSION_ID.match(entry.name):
+                continue
+            try:
+                _, expires_at = self._read(entry.path)
+            except (OSError, ValueError):
+                continue
+            if expires_at <= now:
+                self.delete(entry.name)
+                removed += 1
+        return removed
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, cache, refresh_interval, sweep_interval):
+        self.store = store
+        self.cache = cache
+        self.refresh_interval = timedelta(seconds=refresh_interval)
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._lock = Lock()
+
+    def load(self, sid, now):
+        record = self.cache.get(sid)
+        if record is None:
+            record = self.store.load(sid, now)
+            if record is None:
+                return None
+            record = tuple(record)
+            self.cache.set(sid, record)
+        data, expires_at = record
+        return (data, expires_at) if expires_at > now else None
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SESSION_ID.match(sid):
+            record = self.load(sid, datetime.now())
+            if record is not None:
+                try:
+                    return ServerSession(self.serializer.loads(record[0]), sid, record[1])
+                except ValueError:
+                    pass
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                self.cache.invalidate(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    partitioned=partitioned, samesite=samesite, httponly=httponly
+                )
+                response.vary.add('Cookie')
+            return
+
+        if session.rotate and not session.new:
+            self.store.delete(session.sid)
+            self.cache.invalidate(session.sid)
+            session.sid = new_session_id()
+
+        now = datetime.now()
+        expires_at = now + app.permanent_session_lifetime
+        # Unchanged sessions are only written again when their expiry has moved on noticeably
+        stale = session.expires_at is None or session.expires_at < expires_at - self.refresh_interval
+        if not (session.modified or session.new or session.rotate or stale):
+            return
+
+        data = self.serializer.dumps(dict(session))
+        self.store.save(session.sid, data, expires_at)
+        self.cache.set(session.sid, (data, expires_at))
+        if session.new or session.rotate or session.permanent:
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                domain=domain, path=path, secure=secure, partitioned=partitioned, samesite=samesite
+            )
+            response.vary.add('Cookie')
+
+    def start_sweeper(self, app):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = Thread(target=self._sweep, args=(app,), name='session-sweeper', daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    removed = self.store.sweep(datetime.now())
+                    if removed:
+                        app.logger.info('Removed %s expired sessions', removed)
+                except Exception:
+                    app.logger.exception('Sweeping expired sessions failed')
+            sleep(self.sweep_interval)
+
+
+def rotate_session(sender, user, **extra):
+    if isinstance(session._get_current_object(), ServerSession):
+        session.regenerate()
+
+
+def init_sessions(app):
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'filesystem':
+        store = FilesystemSessionStore(app.config['SESSION_FILE_DIR'])
+    elif backend == 'database':
+        store = DatabaseSessionStore()
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND {backend}")
+
+    interface = ServerSessionInterface(
+        store,
+        TTLCache(app.config['SESSION_CACHE_SIZE'], app.config['SESSION_CACHE_TTL']),
+        app.config['SESSION_REFRESH_INTERVAL'],
+        app.config['SESSION_SWEEP_INTERVAL']
+    )
+    app.session_interface = interface
+    app.before_request(lambda: interface.start_sweeper(app))
+    user_logged_in.connect(rotate_session, app)
@@ -0,0 +1,75 @@
+from app import db
+from app.models import FlashCard, Topic
+from app.scheduler import due_filter, next_due_at
+from app.ttl_cache import TTLCache
+from app.utils import get_cards_version
+import sqlalchemy as sa
+from datetime import datetime, time
+
+stats_cache = TTLCache(config_prefix='STATS_CACHE')
+
+
+def compute_user_stats(user_id):
+    today = datetime.now().date()
+    today_start = datetime.combine(today, time.min)
+    # Only cards reviewed today or due are read, totals come from the topic counters
+    activity = {
+        topic_id: (reviewed, revision)
+        for topic_id, reviewed, revision in db.session.execute(
+            sa.select(
+                FlashCard.topic_id,
+                sa.func.sum(sa.case((FlashCard.last_seen >= today_start, 1), else_=0)),
+                sa.func.sum(sa.case((due_filter(), 1), else_=0))
+            )
+            .where(FlashCard.user_id == user_id)
+            .where(sa.or_(FlashCard.last_seen >= today_start, due_filter()))
+            .group_by(FlashCard.topic_id)
+        )
+    }
+    rows = db.session.execute(
+        sa.select(Topic.id, Topic.name, Topic.card_count, Topic.mastered_count)
+        .where(Topic.user_id == user_id)
+        .where(Topic.card_count > 0)
+        .order_by(Topic.name)
+    )
+    topics = {}
+    for topic_id, topic, total, mastered in rows:
+        reviewed, revision = activity.get(topic_id, (0, 0))
+        topics[topic] = {
+            'cards_total': total,
+            'cards_mastered': mastered,
+            'cards_today': reviewed,
+            'cards_revision': revision
+        }
+    cards_total = sum(info['cards_total'] for info in topics.values())
+    cards_today = sum(info['cards_today'] for info in topics.values())
+    return {
+        'today': today,
+        'cards_total': cards_total,
+        'cards_today': cards_today,
+        'cards_revision': sum(info['cards_revision'] for info in topics.values()),
+        'cards_percent_complete': round((cards_today / cards_total) * 100) if cards_total != 0 else 0,
+        'topics': topics
+    }
+
+
+def get_user_stats(user_id):
+    # Entries carry the cards version they were computed at, so changes made by other processes
+    # (such as `flask worker`) are picked up as soon as the version moves on. They also end when the
+    # next card comes due, so the due counts never lag behind the ETag built for the page.
+    now = datetime.now()
+    version = get_cards_version(user_id)
+    cached = stats_cache.get(user_id)
+    if cached is not None:
+        cached_version, stats, next_due = cached
+        if cached_version == version and stats['today'] == now.date() and (next_due is None or now < next_due):
+            return stats
+
+    next_due = next_due_at(user_id, now)
+    stats = compute_user_stats(user_id)
+    stats_cache.set(user_id, (version, stats, next_due))
+    return stats
+
+
+def invalidate_user_stats(user_id):
+    stats_cache.invalidate(user_id)
@@ -0,0 +1,156 @@
+from app import db
+from app.models import FlashCard, StudySession, StudyQueueItem
+from app.scheduler import REVISION_QUEUE_SIZE
+from app.utils import topic_filters, is_revision_topic, reset_progress, bump_cards_version
+import sqlalchemy as sa
+from datetime import datetime
+import random
+
+
+def get_study_session(user_id, topic):
+    return db.session.scalar(
+        sa.select(StudySession).where(StudySession.user_id == user_id).where(StudySession.topic == topic)
+    )
+
+
+def end_study_sessions(user_id, topic=None):
+    filters = [StudySession.user_id == user_id]
+    if topic is not None:
+        filters.append(StudySession.topic == topic)
+    db.session.execute(
+        sa.delete(StudyQueueItem).where(StudyQueueItem.session_id.in_(sa.select(StudySession.id).where(*filters)))
+    )
+    db.session.execute(sa.delete(StudySession).where(*filters))
+
+
+def start_study_session(user_id, topic, avoid_card_id=None):
+    filters = topic_filters(user_id, topic)
+    query = sa.select(FlashCard.id).where(*filters)
+    if is_revision_topic(topic):
+        query = query.order_by(FlashCard.due_at).limit(REVISION_QUEUE_SIZE)
+    card_ids = list(db.session.scalars(query))
+    random.shuffle(card_ids)
+    if avoid_card_id is not None and len(card_ids) > 1 and card_ids[0] == avoid_card_id:
+        swap = random.randrange(1, len(card_ids))
+        card_ids[0], card_ids[swap] = card_ids[swap], card_ids[0]
+
+    end_study_sessions(user_id, topic)
+    session = StudySession(user_id=user_id, topic=topic, position=0, size=len(card_ids))
+    db.session.add(session)
+    db.session.flush()
+    if card_ids:
+        db.session.execute(
+            sa.insert(StudyQueueItem),
+            [{'session_id': session.id, 'position': i, 'card_id': card_id} for i, card_id in enumerate(card_ids)]
+        )
+    reset_progress(filters)
+    return session
+
+
+def _queued_card(session, position, forward=True):
+    query = (
+        sa.select(FlashCard, StudyQueueItem.position)
+        .join(StudyQueueItem, StudyQueueItem.card_id == FlashCard.id)
+        .where(StudyQueueItem.session_id == session.id)
+        .where(FlashCard.user_id == session.user_id)
+    )
+    if forward:
+        query = query.where(StudyQueueItem.position >= position).order_by(StudyQueueItem.position)
+    else:
+        query = query.where(StudyQueueItem.position <= position).order_by(StudyQueueItem.position.desc())
+    row = db.session.execute(query.limit(1)).first()
+    if row is None:
+        return None
+    card, session.position = row
+    return card
+
+
+def queued_card(session, card_id):
+    # Only cards in this session's queue, so a token from another topic cannot be studied under this one
+    row = db.session.execute(
+        sa.select(FlashCard, StudyQueueItem.position)
+        .join(StudyQueueItem, StudyQueueItem.card_id == FlashCard.id)
+        .where(StudyQueueItem.session_id == session.id)
+        .where(FlashCard.user_id == session.user_id)
+        .where(FlashCard.id == card_id)
+    ).first()
+    if row is None:
+        return None
+    card, session.position = row
+    return card
+
+
+def queued_card_id(session):
+    return db.session.scalar(
+        sa.select(StudyQueueItem.card_id)
+        .where(StudyQueueItem.session_id == session.id)
+        .where(StudyQueueItem.position == session.position)
+    )
+
+
+def first_queued_card(session):
+    return _queued_card(session, 0)
+
+
+def current_queued_card(session):
+    return _queued_card(session, session.position)
+
+
+def next_queued_card(session):
+    card = _queued_card(session, session.position + 1)
+    if card is None:
+        session = start_study_session(session.user_id, session.topic, avoid_card_id=queued_card_id(session))
+        card = _queued_card(session, 0)
+    return session, card
+
+
+def previous_queued_card(session):
+    if session.position == 0:
+        return _queued_card(session, 0)
+    return _queued_card(session, session.position - 1, forward=False)
+
+
+def _upcoming_queue(session, count):
+    return db.session.execute(
+        sa.select(FlashCard, StudyQueueItem.position)
+        .join(StudyQueueItem, StudyQueueItem.card_id == FlashCard.id)
+        .where(StudyQueueItem.session_id == session.id)
+        .where(FlashCard.user_id == session.user_id)
+        .where(StudyQueueItem.position >= session.position)
+        .order_by(StudyQueueItem.position)
+        .limit(count)
+    ).all()
+
+
+def upcoming_queued_cards(session, count):
+    return [card for card, position in _upcoming_queue(session, count)]
+
+
+def take_queued_cards(session, count):
+    # Hands out the next cards and moves the session past them, starting a new round once the queue runs out
+    rows = _upcoming_queue(session, count)
+    if not rows and session.size:
+        session = start_study_session(session.user_id, session.topic)
+        rows = _upcoming_queue(session, count)
+    if rows:
+        session.position = rows[-1][1] + 1
+    return session, [card for card, position in rows]
+
+
+def show_card(card):
+    first_view = not card.seen
+    if first_view:
+        card.last_seen = datetime.now()
+        bump_cards_version(card.user_id)
+    card.seen = True
+    return first_view
+
+
+def show_cards(cards):
+    unseen = [card.id for card in cards if not card.seen]
+    if unseen:
+        db.session.execute(
+            sa.update(FlashCard).where(FlashCard.id.in_(unseen)).values(seen=True, last_seen=datetime.now())
+        )
+        bump_cards_version(cards[0].user_id)
+    return bool(unseen)
@@ -0,0 +1,65 @@
+from flask import current_app
+from functools import lru_cache
+import hashlib
+import hmac
+
+# Card tokens are the card id in fixed width base62 followed by a truncated HMAC of it
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ALPHABET_INDEX = {char: i for i, char in enumerate(ALPHABET)}
+ID_WIDTH = 6
+MAC_BYTES = 8
+MAC_WIDTH = 11
+TOKEN_LENGTH = ID_WIDTH + MAC_WIDTH
+
+
+def _encode(number, width):
+    chars = []
+    for _ in range(width):
+        number, remainder = divmod(number, 62)
+        chars.append(ALPHABET[remainder])
+    if number:
+        raise ValueError(f"{number} does not fit in {width} base62 characters")
+    return ''.join(reversed(chars))
+
+
+def _decode(text):
+    number = 0
+    for char in text:
+        number = number * 62 + ALPHABET_INDEX[char]
+    return number
+
+
+@lru_cache(maxsize=4)
+def _signer(secret_key):
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode()
+    key = hmac.new(secret_key, b'mindcraft.card-token', hashlib.sha256).digest()
+    return hmac.new(key, digestmod=hashlib.sha256)
+
+
+def _mac(signer, card_id):
+    mac = signer.copy()
+    mac.update(card_id.to_bytes(8, 'big'))
+    return _encode(int.from_bytes(mac.digest()[:MAC_BYTES], 'big'), MAC_WIDTH)
+
+
+def card_tokens(card_ids):
+    signer = _signer(current_app.config['SECRET_KEY'])
+    return {card_id: _encode(card_id, ID_WIDTH) + _mac(signer, card_id) for card_id in card_ids}
+
+
+def card_token(card_id):
+    return card_tokens((card_id,))[card_id]
+
+
+def decode_card_token(token):
+    if not isinstance(token, str) or len(token) != TOKEN_LENGTH:
+        return None
+    try:
+        card_id = _decode(token[:ID_WIDTH])
+    except KeyError:
+        return None
+    signer = _signer(current_app.config['SECRET_KEY'])
+    if not hmac.compare_digest(_mac(signer, card_id), token[ID_WIDTH:]):
+        return None
+    return card_id
@@ -0,0 +1,62 @@
+from app import db
+from app.models import FlashCard, Topic
+from app.scheduler import mastered_filter
+import sqlalchemy as sa
+
+
+def get_topic(user_id, name):
+    return db.session.scalar(sa.select(Topic).where(Topic.user_id == user_id).where(Topic.name == name))
+
+
+def topic_id_query(user_id, name):
+    return sa.select(Topic.id).where(Topic.user_id == user_id).where(Topic.name == name).scalar_subquery()
+
+
+def get_or_create_topic(user_id, name):
+    topic = get_topic(user_id, name)
+    if topic is None:
+        topic = Topic(user_id=user_id, name=name, card_count=0, mastered_count=0)
+        db.session.add(topic)
+        db.session.flush()
+    return topic
+
+
+def ensure_topics(user_id, names):
+    names = set(names)
+    topic_ids = dict(db.session.execute(
+        sa.select(Topic.name, Topic.id).where(Topic.user_id == user_id).where(Topic.name.in_(names))
+    ).all())
+    missing = names - topic_ids.keys()
+    if missing:
+        db.session.execute(
+            sa.insert(Topic),
+            [{'user_id': user_id, 'name': name, 'card_count': 0, 'mastered_count': 0} for name in missing]
+        )
+        topic_ids.update(db.session.execute(
+            sa.select(Topic.name, Topic.id).where(Topic.user_id == user_id).where(Topic.name.in_(missing))
+        ).all())
+    return topic_ids
+
+
+def add_topic_counts(topic_id, cards=0, mastered=0):
+    db.session.execute(
+        sa.update(Topic).where(Topic.id == topic_id).values(
+            card_count=Topic.card_count + cards,
+            mastered_count=Topic.mastered_count + mastered
+        )
+    )
+
+
+def refresh_topic_counts(topic_ids):
+    # Recount after set-based writes and drop topics that no longer have cards
+    topic_ids = list(topic_ids)
+    if not topic_ids:
+        return
+    card_count = sa.select(sa.func.count(FlashCard.id)).where(FlashCard.topic_id == Topic.id)
+    db.session.execute(
+        sa.update(Topic).where(Topic.id.in_(topic_ids)).values(
+            card_count=card_count.scalar_subquery(),
+            mastered_count=card_count.where(mastered_filter()).scalar_subquery()
+        )
+    )
+    db.session.execute(sa.delete(Topic).where(Topic.id.in_(topic_ids)).where(Topic.card_count == 0))
@@ -0,0 +1,3 @@
+from app.ttl_cache import TTLCache
+
+user_cache = TTLCache(config_prefix='USER_CACHE')
@@ -1,38 +1,217 @@
 from app import db
-from app.models import User, FlashCard
+from app.models import User, FlashCard, Topic
+from app.scheduler import due_filter, is_mastered
+from app.tokens import card_tokens
+from app.topics import (get_topic, get_or_create_topic, topic_id_query, add_topic_counts,
+                        refresh_topic_counts)
 import sqlalchemy as sa
+from datetime import datetime
 
+REVISION_PREFIX = 'revision - '
 
-def reset_and_get_topic_info(user):
-    topics = {}
-    for card in user.flash_cards:
-        if card.topic in topics:
-            topics[card.topic][card.id] = {'question': card.question, 'answer': card.answer}
-        else:
-            topics[card.topic] = {card.id: {'question': card.question, 'answer': card.answer}}
 
-    for card in user.flash_cards:
-        card.seen = False
-    db.session.commit()
-    return topics
+def get_topic_counts(user_id):
+    rows = db.session.execute(
+        sa.select(Topic.name, Topic.card_count)
+        .where(Topic.user_id == user_id)
+        .where(Topic.card_count > 0)
+        .order_by(Topic.name)
+    )
+    return {topic: count for topic, count in rows}
+
+
+def get_revision_counts(user_id):
+    rows = db.session.execute(
+        sa.select(Topic.name, sa.func.count(FlashCard.id))
+        .join(FlashCard.topic)
+        .where(FlashCard.user_id == user_id)
+        .where(due_filter())
+        .group_by(Topic.id, Topic.name)
+        .order_by(Topic.name)
+    )
+    return {f"{REVISION_PREFIX}{topic}": count for topic, count in rows}
+
+
+def get_topic_cards(user_id, topic, page, per_page):
+    query = (
+        sa.select(FlashCard.id, Topic.name, FlashCard.question, FlashCard.answer)
+        .join(FlashCard.topic)
+        .where(*topic_filters(user_id, topic))
+    )
+    if is_revision_topic(topic):
+        query = query.order_by(FlashCard.due_at, FlashCard.id)
+    else:
+        query = query.order_by(FlashCard.id)
+    rows = db.session.execute(query.offset((page - 1) * per_page).limit(per_page + 1)).all()
+    tokens = card_tokens(row.id for row in rows[:per_page])
+    cards = [
+        {'id': card_id, 'token': tokens[card_id], 'topic': card_topic, 'question': question, 'answer': answer}
+        for card_id, card_topic, question, answer in rows[:per_page]
+    ]
+    return cards, len(rows) > per_page
+
+
+def reset_progress(filters):
+    db.session.execute(
+        sa.update(FlashCard).where(*filters).where(FlashCard.seen.is_(True)).values(seen=False)
+    )
+
+
+def get_cards_version(user_id):
+    return db.session.scalar(sa.select(User.cards_version).where(User.id == user_id))
+
+
+def bump_cards_version(user_id):
+    # Any change to a user's cards moves this on, pages use it as their ETag
+    db.session.execute(
+        sa.update(User).where(User.id == user_id).values(cards_version=User.cards_version + 1)
+    )
+
+
+def create_card(user_id, topic, question, answer):
+    topic = get_or_create_topic(user_id, topic)
+    card = FlashCard(topic_id=topic.id, question=question, answer=answer, user_id=user_id)
+    db.session.add(card)
+    add_topic_counts(topic.id, cards=1)
+    bump_cards_version(user_id)
+    return card
+
+
+def update_card(card, topic, question, answer):
+    if card.topic.name != topic:
+        mastered = 1 if is_mastered(card) else 0
+        add_topic_counts(card.topic_id, cards=-1, mastered=-mastered)
+        new_topic = get_or_create_topic(card.user_id, topic)
+        add_topic_counts(new_topic.id, cards=1, mastered=mastered)
+        card.topic = new_topic
+    card.question = question
+    card.answer = answer
+    bump_cards_version(card.user_id)
+    return card
+
+
+def delete_cards(user_id, card_ids):
+    topic_ids = db.session.scalars(
+        sa.delete(FlashCard).where(FlashCard.user_id == user_id).where(FlashCard.id.in_(card_ids))
+        .returning(FlashCard.topic_id)
+    ).all()
+    refresh_topic_counts(set(topic_ids))
+    if topic_ids:
+        bump_cards_version(user_id)
+    return len(topic_ids)
+
+
+def rename_topic_cards(user_id, topic, new_topic):
+    source = get_topic(user_id, topic)
+    if source is None or topic == new_topic:
+        return 0
+    target = get_topic(user_id, new_topic)
+    bump_cards_version(user_id)
+    if target is None:
+        source.name = new_topic
+        return source.card_count
+
+    # Merging into an existing topic moves the cards and drops the old row
+    result = db.session.execute(
+        sa.update(FlashCard).where(FlashCard.topic_id == source.id).values(topic_id=target.id)
+    )
+    db.session.expire(source)
+    refresh_topic_counts([source.id, target.id])
+    return result.rowcount
+
+
+def reset_topic_stats(user_id, topic):
+    topic = get_topic(user_id, topic)
+    if topic is None:
+        return 0
+    result = db.session.execute(
+        sa.update(FlashCard).where(FlashCard.topic_id == topic.id)
+        .values(
+            seen=False,
+            last_seen=None,
+            times_seen=0,
+            times_correct=0,
+            times_wrong=0,
+            ease=100,
+            ease_factor=2.5,
+            interval_days=0,
+            repetitions=0,
+            due_at=None
+        )
+    )
+    topic.mastered_count = 0
+    bump_cards_version(user_id)
+    return result.rowcount
 
 
 def get_user_by_username(name):
     return db.session.scalar(sa.select(User).where(User.username == name))
 
 
-def calculate_ease(card):
-    percent = (card.times_correct / card.times_seen) * 100
-    return max(1, int(percent))
+USER_SORTS = ('id', 'username', 'cards', 'last_active')
+NEVER_ACTIVE = datetime(1970, 1, 1)
 
 
-def grade_card(card, correct):
-    card.times_seen += 1
-    if correct:
-        card.times_correct += 1
+def get_user_page(per_page, sort='id', descending=False, role=None, prefix=None, after=None):
+    # One grouped join over the (user_id, last_seen) index gives the card count and last activity per user
+    cards = sa.func.count(FlashCard.id).label('cards')
+    last_active = sa.func.coalesce(
+        sa.func.max(FlashCard.last_seen), sa.literal(NEVER_ACTIVE, sa.DateTime)
+    ).label('last_active')
+    sort_column = {'id': User.id, 'username': User.username, 'cards': cards, 'last_active': last_active}[sort]
+    query = (
+        sa.select(User, cards, last_active)
+        .outerjoin(FlashCard, FlashCard.user_id == User.id)
+        .group_by(User.id)
+    )
+    if role:
+        query = query.where(User.role == role)
+    if prefix:
+        query = query.where(User.username.startswith(prefix, autoescape=True))
+
+    if after is not None:
+        key = sa.tuple_(sort_column, User.id)
+        cursor = sa.tuple_(sa.literal(after[0], sort_column.type), sa.literal(after[1]))
+        condition = key < cursor if descending else key > cursor
+        query = query.having(condition) if sort in ('cards', 'last_active') else query.where(condition)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), User.id.desc())
     else:
-        card.times_wrong += 1
+        query = query.order_by(sort_column, User.id)
+    rows = db.session.execute(query.limit(per_page + 1)).all()
+    next_key = None
+    if len(rows) > per_page:
+        last = rows[per_page - 1]
+        value = getattr(last, sort) if sort in ('cards', 'last_active') else getattr(last.User, sort)
+        next_key = (value, last.User.id)
+    return rows[:per_page], next_key
 
-    card.ease = calculate_ease(card)
-    db.session.commit()
-    return card
+
+def is_revision_topic(topic):
+    return topic == 'revision' or topic.startswith(REVISION_PREFIX)
+
+
+def topic_name(topic):
+    if topic == 'revision':
+        return None
+    return topic.removeprefix(REVISION_PREFIX)
+
+
+def topic_filters(user_id, topic):
+    filters = [FlashCard.user_id == user_id]
+    name = topic_name(topic)
+    if name is not None:
+        filters.append(FlashCard.topic_id == topic_id_query(user_id, name))
+    if is_revision_topic(topic):
+        filters.append(due_filter())
+    return filters
+
+
+def get_card(filters, card_id):
+    return db.session.scalar(sa.select(FlashCard).where(*filters).where(FlashCard.id == card_id))
+
+
+def calculate_ease(card):
+    percent = (card.times_correct / card.times_seen) * 100
+    return max(1, int(percent))
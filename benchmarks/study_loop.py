@@ -0,0 +1,175 @@
+"""Benchmark the study loop against a seeded SQLite database.
+
+Seeds users x cards x topics, then drives the real app through
+login -> dashboard -> topics -> view_topic -> card_correct/card_wrong -> next_card
+with the Flask test client and reports latency percentiles, requests per
+second and SQL queries per request for every deck size.
+
+    python benchmarks/study_loop.py --cards 100,1000,10000 --users 2 --topics 10
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User, FlashCard
+from app.topics import ensure_topics, refresh_topic_counts
+from config import Config
+
+PASSWORD = 'Benchmark1!'
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+GRADE_PATTERN = re.compile(r'href="(/flashcards/card_(?:correct|wrong)/[^"]+)"')
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_config(path, sync_reviews):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        REVIEW_LOG_FLUSH_INTERVAL = 0 if sync_reviews else Config.REVIEW_LOG_FLUSH_INTERVAL
+
+    return BenchmarkConfig
+
+
+def seed(app, users, cards, topics):
+    password_hash = generate_password_hash(PASSWORD)
+    with app.app_context():
+        db.create_all()
+        for number in range(users):
+            user = User(
+                username=f"bench{number}",
+                email=f"bench{number}@example.com",
+                password_hash=password_hash,
+                role='Normal'
+            )
+            db.session.add(user)
+            db.session.flush()
+            topic_ids = ensure_topics(user.id, [f"topic {topic}" for topic in range(topics)])
+            rows = [
+                {
+                    'user_id': user.id,
+                    'topic_id': topic_ids[f"topic {card % topics}"],
+                    'question': f"Question {card}",
+                    'answer': f"Answer {card}",
+                    'seen': False
+                }
+                for card in range(cards)
+            ]
+            for start in range(0, len(rows), 5000):
+                db.session.execute(sa.insert(FlashCard), rows[start:start + 5000])
+            refresh_topic_counts(topic_ids.values())
+        db.session.commit()
+
+
+class Recorder:
+    def __init__(self, app):
+        self.app = app
+        self.adapter = app.url_map.bind('localhost')
+        self.queries = 0
+        self.thread = threading.get_ident()
+        self.latency = defaultdict(list)
+        self.query_counts = defaultdict(list)
+        with app.app_context():
+            sa.event.listen(db.engine, 'before_cursor_execute', self.count_query)
+
+    def count_query(self, *args):
+        # the review log writer flushes from its own thread
+        if threading.get_ident() == self.thread:
+            self.queries += 1
+
+    def request(self, client, method, path, **kwargs):
+        endpoint = self.adapter.match(path.split('?')[0], method=method)[0]
+        self.queries = 0
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        self.latency[endpoint].append(time.perf_counter() - start)
+        self.query_counts[endpoint].append(self.queries)
+        return response
+
+    def follow(self, client, response):
+        while response.status_code in (301, 302, 303):
+            response = self.request(client, 'GET', response.location)
+        return response
+
+
+def study(recorder, client, username, iterations):
+    login_page = client.get('/auth/login')
+    token = CSRF_PATTERN.search(login_page.text).group(1)
+    response = recorder.request(
+        client, 'POST', '/auth/login',
+        data={'username': username, 'password': PASSWORD, 'csrf_token': token}
+    )
+    recorder.follow(client, response)
+    recorder.request(client, 'GET', '/flashcards/topics')
+
+    response = recorder.request(client, 'GET', '/flashcards/topic 0/start/question')
+    for _ in range(iterations):
+        grade_links = GRADE_PATTERN.findall(response.text)
+        if not grade_links:
+            break
+        response = recorder.request(client, 'GET', random.choice(grade_links).replace('&amp;', '&'))
+        response = recorder.follow(client, response)
+
+
+def run(cards, args):
+    handle, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(handle)
+    try:
+        app = create_app(make_config(path, args.sync_reviews))
+        seed(app, args.users, cards, args.topics)
+        recorder = Recorder(app)
+        start = time.perf_counter()
+        for number in range(args.users):
+            study(recorder, app.test_client(), f"bench{number}", args.iterations)
+        elapsed = time.perf_counter() - start
+        app.extensions['review_log_writer'].flush()
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+    total = sum(len(latencies) for latencies in recorder.latency.values())
+    print(f"\n{cards} cards per user, {args.users} users, {args.topics} topics: "
+          f"{total} requests, {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<32}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}")
+    for endpoint, latencies in sorted(recorder.latency.items()):
+        queries = recorder.query_counts[endpoint]
+        print(f"{endpoint:<32}{len(latencies):>6}"
+              f"{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 95) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}"
+              f"{sum(queries) / len(queries):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', default='100,1000,10000', help='Comma separated deck sizes per user.')
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=200, help='Cards graded per user.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sync-reviews', action='store_true', help='Write review logs inside the request.')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for cards in (int(size) for size in args.cards.split(',')):
+        run(cards, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,109 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
+def env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def database_uri():
+    uri = os.environ.get('DATABASE_URL')
+    if not uri:
+        return 'sqlite:///' + os.path.join(basedir, 'instance', 'data', 'data.sqlite')
+    if uri.startswith('postgres://'):
+        uri = uri.replace('postgres://', 'postgresql://', 1)
+    return uri
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or b'WR#&f&+%78er0we=%799eww+#7^90-;s'
 
     UPLOAD_FOLDER = os.path.join(basedir, 'instance', 'data', 'uploads')
-    MAX_CONTENT_LENGTH = 1 * 1024 * 1024
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)
+    IMPORT_CHUNK_SIZE = 1000
     REMEMBER_COOKIE_DURATION = 60 * 60 * 24 * 7
 
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'instance', 'data', 'data.sqlite')
+    # Logged in users are cached per process, role changes in other processes show up after the TTL
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
+
+    # Dashboard stats are cached per process and recomputed when the user's cards version changes
+    STATS_CACHE_SIZE = 1024
+    STATS_CACHE_TTL = 60
+
+    # Any werkzeug method, e.g. "scrypt:16384:8:1" or "pbkdf2:sha256:600000". Existing hashes are
+    # upgraded the next time their user logs in.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_THREADS = env_int('PASSWORD_HASH_THREADS') or 2
+    PASSWORD_HASH_QUEUE = 16
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Token buckets checked before any password is hashed: a burst of attempts, then one per refill interval
+    LOGIN_IP_BURST = 20
+    LOGIN_IP_REFILL_SECONDS = 3
+    LOGIN_USERNAME_BURST = 5
+    LOGIN_USERNAME_REFILL_SECONDS = 30
+    LOGIN_LIMITER_SIZE = 10000
+    # Number of reverse proxies in front of the app whose X-Forwarded-For/-Proto/-Host headers are trusted.
+    # Leave at 0 without a proxy, or clients could pick their own IP and dodge the per-IP login bucket.
+    PROXY_FIX_HOPS = env_int('PROXY_FIX_HOPS') or 0
+
+    # "database" or "filesystem" keep sessions on the server behind a random id cookie, "cookie" is Flask's
+    # signed cookie session.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'database'
+    SESSION_FILE_DIR = os.path.join(basedir, 'instance', 'data', 'sessions')
+    # Opt-in per process session cache. With more than one process, a cached session can outlive a logout
+    # made through another process for up to SESSION_CACHE_TTL seconds, and a request served from a stale
+    # copy writes it back over newer data. Only enable it with a single process or when that is acceptable.
+    SESSION_CACHE_SIZE = env_int('SESSION_CACHE_SIZE') or 0
+    SESSION_CACHE_TTL = 10
+    SESSION_REFRESH_INTERVAL = 60 * 60
+    SESSION_SWEEP_INTERVAL = 60 * 60
+
+    SQLALCHEMY_DATABASE_URI = database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Applied to every new SQLite connection, ignored for other databases
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': env_int('SQLITE_BUSY_TIMEOUT') or 5000,
+        'cache_size': -(env_int('SQLITE_CACHE_SIZE_KB') or 64000),
+        'mmap_size': env_int('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024,
+        'foreign_keys': 'ON'
+    }
+
+    # Connection pool sizing for server databases such as PostgreSQL
+    DATABASE_POOL_SIZE = env_int('DATABASE_POOL_SIZE')
+    DATABASE_MAX_OVERFLOW = env_int('DATABASE_MAX_OVERFLOW')
+    DATABASE_POOL_TIMEOUT = env_int('DATABASE_POOL_TIMEOUT')
+    DATABASE_POOL_RECYCLE = env_int('DATABASE_POOL_RECYCLE')
+
+    TOPIC_CARDS_PER_PAGE = 25
+    TOPIC_CARDS_MAX_PER_PAGE = 100
+    SEARCH_RESULTS_PER_PAGE = 20
+    ADMIN_USERS_PER_PAGE = 50
+    STUDY_PREFETCH_SIZE = 5
+    STUDY_BATCH_SIZE = 20
+    STUDY_PREFETCH_MAX = 50
+    REVIEW_BATCH_MAX = 500
+    REVIEW_MAX_AGE_DAYS = 7
+
+    REVIEW_LOG_BATCH_SIZE = 100
+    REVIEW_LOG_FLUSH_INTERVAL = 0.25
+
+    USER_PURGE_CHUNK_SIZE = 1000
+    USER_PURGE_PAUSE = 0.05
+
+    # Set JOBS_IN_PROCESS=0 when a separate `flask worker` process runs the job queue
+    JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', '1').lower() in ('1', 'true', 'yes')
+    JOB_WORKER_THREADS = env_int('JOB_WORKER_THREADS') or 2
+    JOB_POLL_INTERVAL = 1.0
+    JOB_RETRY_DELAY = 30
+    JOB_TIMEOUT = 60 * 60
+
+    HTTP_ETAG_MAX_AGE = 30 * 60
+    STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+    METRICS_ENABLED = True
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,26 @@
+"""Add user cards version
+
+Revision ID: 0a6d9e2c4b71
+Revises: f5c1a3d8e926
+Create Date: 2026-10-19 08:12:37.540218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d9e2c4b71'
+down_revision = 'f5c1a3d8e926'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cards_version', sa.Integer(), nullable=False, server_default=sa.text('0')))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('cards_version')
@@ -0,0 +1,30 @@
+"""Add card selection indexes
+
+Revision ID: 3e9a1c7d5b20
+Revises: b631d6533618
+Create Date: 2026-10-18 19:40:12.481305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9a1c7d5b20'
+down_revision = 'b631d6533618'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.create_index('ix_flash_cards_user_topic_seen', ['user_id', 'topic', 'seen'], unique=False)
+        batch_op.create_index('ix_flash_cards_user_ease', ['user_id', 'ease'], unique=False)
+        batch_op.create_index('ix_flash_cards_user_last_seen', ['user_id', 'last_seen'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.drop_index('ix_flash_cards_user_last_seen')
+        batch_op.drop_index('ix_flash_cards_user_ease')
+        batch_op.drop_index('ix_flash_cards_user_topic_seen')
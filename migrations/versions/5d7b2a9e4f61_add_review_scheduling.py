@@ -0,0 +1,76 @@
+"""Add review scheduling
+
+Revision ID: 5d7b2a9e4f61
+Revises: 8c2f4e6a9d13
+Create Date: 2026-10-18 20:41:17.330864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime, timedelta
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7b2a9e4f61'
+down_revision = '8c2f4e6a9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.add_column(sa.Column(
+            'ease_factor',
+            sa.Float(),
+            nullable=False,
+            server_default=sa.text('2.5')
+        ))
+        batch_op.add_column(sa.Column(
+            'interval_days',
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text('0')
+        ))
+        batch_op.add_column(sa.Column(
+            'repetitions',
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text('0')
+        ))
+        batch_op.add_column(sa.Column('due_at', sa.DateTime(), nullable=True))
+        batch_op.drop_index('ix_flash_cards_user_ease')
+        batch_op.create_index('ix_flash_cards_user_due_at', ['user_id', 'due_at'], unique=False)
+
+    # Cards that were in the old ease <= 75 revision set are due now, the
+    # rest of the reviewed cards get a first one day interval.
+    now = datetime.now()
+    flash_cards = sa.table(
+        'flash_cards',
+        sa.column('times_seen', sa.Integer),
+        sa.column('ease', sa.Integer),
+        sa.column('interval_days', sa.Integer),
+        sa.column('repetitions', sa.Integer),
+        sa.column('due_at', sa.DateTime)
+    )
+    op.execute(
+        flash_cards.update()
+        .where(flash_cards.c.times_seen > 0)
+        .where(flash_cards.c.ease <= 75)
+        .values(due_at=now)
+    )
+    op.execute(
+        flash_cards.update()
+        .where(flash_cards.c.times_seen > 0)
+        .where(flash_cards.c.ease > 75)
+        .values(due_at=now + timedelta(days=1), interval_days=1, repetitions=1)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.drop_index('ix_flash_cards_user_due_at')
+        batch_op.create_index('ix_flash_cards_user_ease', ['user_id', 'ease'], unique=False)
+        batch_op.drop_column('due_at')
+        batch_op.drop_column('repetitions')
+        batch_op.drop_column('interval_days')
+        batch_op.drop_column('ease_factor')
@@ -0,0 +1,26 @@
+"""Add user role index
+
+Revision ID: 7f3b8c1d2e94
+Revises: 0a6d9e2c4b71
+Create Date: 2026-10-19 09:05:11.872046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3b8c1d2e94'
+down_revision = '0a6d9e2c4b71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_role'), ['role'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_role'))
@@ -0,0 +1,50 @@
+"""Add study sessions
+
+Revision ID: 8c2f4e6a9d13
+Revises: 3e9a1c7d5b20
+Create Date: 2026-10-18 20:05:41.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2f4e6a9d13'
+down_revision = '3e9a1c7d5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'study_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('topic', sa.String(length=64), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'topic')
+    )
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_study_sessions_user_id'), ['user_id'], unique=False)
+
+    op.create_table(
+        'study_queue_items',
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('card_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['session_id'], ['study_sessions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('session_id', 'position')
+    )
+
+
+def downgrade():
+    op.drop_table('study_queue_items')
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_study_sessions_user_id'))
+
+    op.drop_table('study_sessions')
@@ -0,0 +1,96 @@
+"""Add user deletion
+
+Revision ID: 9d4e6f1a2b83
+Revises: 7f3b8c1d2e94
+Create Date: 2026-10-19 10:21:48.306519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e6f1a2b83'
+down_revision = '7f3b8c1d2e94'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) for every foreign key that cascades when a user is deleted
+USER_FOREIGN_KEYS = (
+    ('topics', 'user_id', 'users'),
+    ('flash_cards', 'user_id', 'users'),
+    ('flash_cards', 'topic_id', 'topics'),
+    ('study_sessions', 'user_id', 'users'),
+    ('review_logs', 'user_id', 'users')
+)
+
+# SQLite foreign keys are unnamed, the convention gives batch mode a name to drop them by
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+# Recreating flash_cards on SQLite drops the search triggers along with the old table
+SQLITE_SEARCH_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_insert AFTER INSERT ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_delete AFTER DELETE ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_update AFTER UPDATE OF question, answer ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END"
+)
+
+
+def restore_search_triggers():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def convention_name(table, column, referred):
+    return NAMING_CONVENTION['fk'] % {'table_name': table, 'column_0_name': column, 'referred_table_name': referred}
+
+
+def foreign_key_name(table, column, referred, offline_name):
+    if op.get_context().as_sql:
+        return offline_name
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if foreign_key['constrained_columns'] == [column]:
+            return foreign_key['name'] or convention_name(table, column, referred)
+    return None
+
+
+def replace_foreign_keys(ondelete, offline_names):
+    for table, column, referred in USER_FOREIGN_KEYS:
+        name = foreign_key_name(table, column, referred, offline_names(table, column, referred))
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            if name is not None:
+                batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(
+                convention_name(table, column, referred), referred, [column], ['id'], ondelete=ondelete
+            )
+    restore_search_triggers()
+
+
+def default_name(table, column, referred):
+    # Keys created before this revision carry PostgreSQL's default names, except the named topic key
+    if column == 'topic_id':
+        return convention_name(table, column, referred)
+    return f"{table}_{column}_fkey"
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    replace_foreign_keys('CASCADE', default_name)
+
+
+def downgrade():
+    replace_foreign_keys(None, convention_name)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,41 @@
+"""Add review logs
+
+Revision ID: a47e3b1c8f25
+Revises: 5d7b2a9e4f61
+Create Date: 2026-10-18 21:12:56.804519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a47e3b1c8f25'
+down_revision = '5d7b2a9e4f61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'review_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('card_id', sa.Integer(), nullable=False),
+        sa.Column('correct', sa.Boolean(), nullable=False),
+        sa.Column('reviewed_at', sa.DateTime(), nullable=False),
+        sa.Column('response_ms', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('review_logs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_review_logs_card_id'), ['card_id'], unique=False)
+        batch_op.create_index('ix_review_logs_user_reviewed_at', ['user_id', 'reviewed_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('review_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_review_logs_user_reviewed_at')
+        batch_op.drop_index(batch_op.f('ix_review_logs_card_id'))
+
+    op.drop_table('review_logs')
@@ -0,0 +1,62 @@
+"""Add flash card full text search
+
+Revision ID: c93d5f0b7e48
+Revises: a47e3b1c8f25
+Create Date: 2026-10-18 22:03:29.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93d5f0b7e48'
+down_revision = 'a47e3b1c8f25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE flash_cards_fts USING fts5("
+            "question, answer, content='flash_cards', content_rowid='id', prefix='2 3')"
+        )
+        op.execute(
+            "CREATE TRIGGER flash_cards_fts_insert AFTER INSERT ON flash_cards BEGIN "
+            "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER flash_cards_fts_delete AFTER DELETE ON flash_cards BEGIN "
+            "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+            "VALUES ('delete', old.id, old.question, old.answer); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER flash_cards_fts_update AFTER UPDATE OF question, answer ON flash_cards BEGIN "
+            "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+            "VALUES ('delete', old.id, old.question, old.answer); "
+            "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+            "END"
+        )
+        op.execute("INSERT INTO flash_cards_fts(flash_cards_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE flash_cards ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', question || ' ' || answer)) STORED"
+        )
+        op.execute("CREATE INDEX ix_flash_cards_search_vector ON flash_cards USING gin (search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS flash_cards_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS flash_cards_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS flash_cards_fts_insert")
+        op.execute("DROP TABLE IF EXISTS flash_cards_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_flash_cards_search_vector")
+        op.execute("ALTER TABLE flash_cards DROP COLUMN IF EXISTS search_vector")
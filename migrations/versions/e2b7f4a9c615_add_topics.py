@@ -0,0 +1,103 @@
+"""Add topics
+
+Revision ID: e2b7f4a9c615
+Revises: c93d5f0b7e48
+Create Date: 2026-10-18 22:47:05.613920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7f4a9c615'
+down_revision = 'c93d5f0b7e48'
+branch_labels = None
+depends_on = None
+
+MASTERED_INTERVAL_DAYS = 21
+
+# Recreating flash_cards on SQLite drops the search triggers along with the old table
+SQLITE_SEARCH_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_insert AFTER INSERT ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_delete AFTER DELETE ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS flash_cards_fts_update AFTER UPDATE OF question, answer ON flash_cards BEGIN "
+    "INSERT INTO flash_cards_fts(flash_cards_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO flash_cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END"
+)
+
+
+def restore_search_triggers():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    op.create_table(
+        'topics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=24), nullable=False),
+        sa.Column('card_count', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('mastered_count', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'name')
+    )
+    with op.batch_alter_table('topics', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_topics_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('topic_id', sa.Integer(), nullable=True))
+
+    op.execute(
+        "INSERT INTO topics (user_id, name, card_count, mastered_count) "
+        "SELECT user_id, topic, COUNT(id), "
+        f"SUM(CASE WHEN interval_days >= {MASTERED_INTERVAL_DAYS} THEN 1 ELSE 0 END) "
+        "FROM flash_cards GROUP BY user_id, topic"
+    )
+    op.execute(
+        "UPDATE flash_cards SET topic_id = ("
+        "SELECT topics.id FROM topics "
+        "WHERE topics.user_id = flash_cards.user_id AND topics.name = flash_cards.topic)"
+    )
+
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.drop_index('ix_flash_cards_user_topic_seen')
+        batch_op.drop_index('ix_flash_cards_topic')
+        batch_op.alter_column('topic_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_flash_cards_topic_id_topics', 'topics', ['topic_id'], ['id'])
+        batch_op.create_index('ix_flash_cards_topic_seen', ['topic_id', 'seen'], unique=False)
+        batch_op.drop_column('topic')
+
+    restore_search_triggers()
+
+
+def downgrade():
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('topic', sa.String(length=24), nullable=True))
+
+    op.execute("UPDATE flash_cards SET topic = (SELECT topics.name FROM topics WHERE topics.id = flash_cards.topic_id)")
+
+    with op.batch_alter_table('flash_cards', schema=None) as batch_op:
+        batch_op.drop_index('ix_flash_cards_topic_seen')
+        batch_op.drop_constraint('fk_flash_cards_topic_id_topics', type_='foreignkey')
+        batch_op.drop_column('topic_id')
+        batch_op.alter_column('topic', existing_type=sa.String(length=24), nullable=False)
+        batch_op.create_index('ix_flash_cards_topic', ['topic'], unique=False)
+        batch_op.create_index('ix_flash_cards_user_topic_seen', ['user_id', 'topic', 'seen'], unique=False)
+
+    restore_search_triggers()
+
+    with op.batch_alter_table('topics', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topics_user_id'))
+
+    op.drop_table('topics')
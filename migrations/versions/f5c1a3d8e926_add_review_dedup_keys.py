@@ -0,0 +1,28 @@
+"""Add review dedup keys
+
+Revision ID: f5c1a3d8e926
+Revises: e2b7f4a9c615
+Create Date: 2026-10-18 23:31:42.207519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c1a3d8e926'
+down_revision = 'e2b7f4a9c615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('review_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dedup_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_review_logs_user_dedup_key', ['user_id', 'dedup_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('review_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_review_logs_user_dedup_key')
+        batch_op.drop_column('dedup_key')